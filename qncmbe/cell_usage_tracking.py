@@ -135,38 +135,37 @@ class CellUsageCalculator():
 
     def collect_temperature_data(self):
 
-        day = self.start_date
         delta = datetime.timedelta(days=1)
 
+        # To avoid collecting enormous amounts of data from Molly at once,
+        # data is collected (and saved) one day at a time
         collector = GrowthDataCollector(
             start_time=self.start_date,
-            end_time=self.start_date + delta,
+            end_time=self.end_date + delta,
             names=self.names,
             savedir=self.save_dir,
             molly_dt=self.delta_t
         )
 
-        logger.info(
-            f"Collecting temperature data for {day.strftime('%Y-%m-%d')}..."
-        )
-        data = collector.get_data(force_reload=self.force_reload)
-
-        day += delta
+        chunks = {name: [] for name in self.names}
 
-        while day <= self.end_date:
+        for new_data in collector.iter_chunks(
+            chunk=delta, force_reload=self.force_reload
+        ):
+            day = new_data[self.names[0]].datetime0
 
             logger.info(
-                f"Collecting temperature data for "
-                f"{day.strftime('%Y-%m-%d')}..."
+                f"Collected temperature data for "
+                f"{day.strftime('%Y-%m-%d')}"
             )
 
-            collector.set_times(day, day + delta)
-            new_data = collector.get_data(force_reload=self.force_reload)
-
             for name in self.names:
-                data[name].add_data(new_data[name])
+                chunks[name].append(new_data[name])
+
+        data = collector.initialize_data()
 
-            day += delta
+        for name in self.names:
+            data[name].add_data_chunks(chunks[name])
 
         self.time = data[self.names[0]].time
 
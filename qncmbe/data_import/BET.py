@@ -1,10 +1,13 @@
 # Standard library imports (not included in setup.py)
 import datetime
+import itertools
 import os
 import re
 
 # qncmbe imports
-from .utils import DataCollector, DataElement
+from .utils import (
+    DataCollector, DataElement, IntervalIndex, PersistentIndex
+)
 from .data_names import index
 
 # Non-standard library imports (included in setup.py)
@@ -20,8 +23,17 @@ class BETDataCollector(DataCollector):
         "Production Data"
     )
 
-    def __init__(self, start_time, end_time, names, savedir=None):
-        '''See docstring for parent (DataCollector)'''
+    def __init__(
+        self, start_time, end_time, names, savedir=None, file_index_path=None
+    ):
+        '''See docstring for parent (DataCollector)
+
+        The creation/modification times of the data files are cached (see
+        BETFileIndex), so that repeated collections with the same collector
+        don't have to check every file again. If file_index_path is given,
+        the cache is also stored in this file so that it persists between
+        collectors.
+        '''
 
         super().__init__(start_time, end_time, names, savedir)
 
@@ -31,6 +43,23 @@ class BETDataCollector(DataCollector):
 
         self.main_data_path = self.default_data_path
 
+        self.set_file_index_path(file_index_path)
+
+    def set_file_index_path(self, file_index_path):
+        '''Set the file used to store the data file times (see BETFileIndex).
+        If None, the times are only cached in memory.'''
+
+        self.file_index = BETFileIndex(file_index_path)
+
+    def copy(self):
+        '''See docstring for parent (DataCollector). The copy gets its own
+        file index (loaded from the same file, if any).'''
+
+        new = super().copy()
+        new.set_file_index_path(self.file_index.index_path)
+
+        return new
+
     def find_bad_data_paths(self):
 
         if os.path.exists(self.main_data_path):
@@ -58,40 +87,74 @@ class BETDataCollector(DataCollector):
         # Loop through files. Add as necessary
         folder_set = {self.parameters[name]['folder'] for name in self.names}
 
+        chunks = {name: [] for name in self.names}
+
         for folder in folder_set:
             folderpath = os.path.join(self.main_data_path, folder)
-            for fname in os.listdir(folderpath):
-                fpath = os.path.join(folderpath, fname)
-                rv = self.is_data_file(fpath)
-                if rv == -1:
-                    self.logger.warning(
-                        f'Skipping problematic data file "{fname}"'
+
+            names = [
+                name for name in self.names
+                if self.parameters[name]['folder'] == folder
+            ]
+
+            # Only read the columns that are needed, with the time column
+            # first
+            tcols = {self.parameters[name]['time_column'] for name in names}
+            cols = sorted(tcols)
+            for name in names:
+                if self.parameters[name]['column'] not in cols:
+                    cols.append(self.parameters[name]['column'])
+
+            with self.stage('list files'):
+                self.file_index.update(folderpath, self.get_file_info)
+                files = self.file_index.find(
+                    folderpath, self.start_time, self.end_time
+                )
+
+            for fpath, file_ctime in files:
+                self.check_cancelled()
+
+                # Rows outside the requested times can only be skipped if
+                # all names share the same time column
+                if len(tcols) == 1:
+                    t_min = (self.start_time - file_ctime).total_seconds()
+                    t_max = (self.end_time - file_ctime).total_seconds()
+                else:
+                    t_min = t_max = None
+
+                with self.stage('read files', files=1):
+                    file_arr, size = read_BET_data_file(
+                        fpath, cols, t_min, t_max, return_size=True
                     )
-                elif rv:
-                    file_arr = np.loadtxt(fpath, skiprows=1)
 
-                    file_ctime, _ = self.get_file_times(fpath)
+                self.record(
+                    'read files', bytes=size,
+                    samples=len(file_arr)*len(names)
+                )
+
+                for name in names:
 
-                    for name in self.names:
-                        if folderpath.endswith(
-                            self.parameters[name]['folder']
-                        ):
+                    col = cols.index(self.parameters[name]['column'])
+                    tcol = cols.index(self.parameters[name]['time_column'])
 
-                            col = self.parameters[name]['column']
-                            tcol = self.parameters[name]['time_column']
+                    chunks[name].append(
+                        DataElement(
+                            name=name,
+                            datetime0=file_ctime,
+                            units=index[name].units,
+                            time=file_arr[:, tcol],
+                            vals=file_arr[:, col]
+                        )
+                    )
+
+        self.file_index.save()
 
-                            self.data[name].add_data(
-                                DataElement(
-                                    name=name,
-                                    datetime0=file_ctime,
-                                    units=index[name].units,
-                                    time=file_arr[:, tcol],
-                                    vals=file_arr[:, col]
-                                )
-                            )
+        with self.stage('join'):
+            for name in self.names:
+                self.data[name].add_data_chunks(chunks[name])
 
-        for name in self.names:
-            self.data[name].trim(self.start_time, self.end_time)
+        with self.stage('trim'):
+            self.trim_data()
 
         return self.data
 
@@ -101,19 +164,39 @@ class BETDataCollector(DataCollector):
 
         Returns -1 if the file is problematic'''
 
+        file_info = self.get_file_info(fpath)
+
+        if file_info is None:
+            return -1
+
+        ctime, mtime = file_info
+
+        time_condition = (
+            (self.start_time < mtime) and (self.end_time > ctime)
+        )
+
+        return time_condition
+
+    def get_file_info(self, fpath, stat=None):
+        '''Gets the creation and modification times of a data file (see
+        get_file_times()), and checks that they are consistent. Also warns
+        if the filename is not in the expected format.
+
+        Returns (ctime, mtime), or None if the file is problematic'''
+
         basename = os.path.basename(fpath)
 
-        ctime, mtime = self.get_file_times(fpath)
+        ctime, mtime = self.get_file_times(fpath, stat)
 
         if ctime is None:
-            return -1
+            return None
 
         if ctime > mtime:
             self.logger.error(
                 f'Timestamp inconsistent with modification time in'
                 f' "{basename}"'
             )
-            return -1
+            return None
 
         name_condition = (
             (basename.startswith('BET') or basename.startswith('ISP'))
@@ -123,25 +206,27 @@ class BETDataCollector(DataCollector):
         if not name_condition:
             self.logger.warning(f'Unexpected filename format "{basename}"')
 
-        time_condition = (
-            (self.start_time < mtime) and (self.end_time > ctime)
-        )
-
-        return time_condition
+        return ctime, mtime
 
-    def get_file_times(self, fpath):
+    def get_file_times(self, fpath, stat=None):
         '''Gets the creation and modification date of the BET data file.
 
         returns (ctime, mtime) as datetime objects
 
+        stat can be given (e.g., from os.scandir()) to avoid calling os.stat
+        on the file again.
+
         Tries to use the file creation time for the best precision. However,
         the file creation time could change significantly if the file is
         copied. So it is verified against the timestamp. If there is a
         conflict, the timestamp will be used (less precise).
         '''
 
-        file_mtime = datetime.datetime.fromtimestamp(os.path.getmtime(fpath))
-        file_ctime = datetime.datetime.fromtimestamp(os.path.getctime(fpath))
+        if stat is None:
+            stat = os.stat(fpath)
+
+        file_mtime = datetime.datetime.fromtimestamp(stat.st_mtime)
+        file_ctime = datetime.datetime.fromtimestamp(stat.st_ctime)
 
         pattern = re.compile(r"(\d\d\.\d\d(.\d\d)?) (\w+, \w+ \d\d, \d{4})")
 
@@ -184,3 +269,172 @@ class BETDataCollector(DataCollector):
         mtime = file_mtime
 
         return ctime, mtime
+
+
+def read_BET_data_file(
+    fpath, cols, t_min=None, t_max=None, chunk_rows=10000, return_size=False
+):
+    '''Reads columns cols from a BET/ISP data file. Returns a 2D array with
+    one column per entry in cols.
+
+    If t_min or t_max is given, cols[0] must be the time column. The file is
+    then read chunk_rows rows at a time, and since the data files are time
+    ordered, chunks that end before t_min are dropped and reading stops at
+    the first chunk that extends past t_max. (So rows outside of the range
+    are not all removed. The data should still be trimmed afterwards.)
+
+    If return_size is True, returns (array, size), where size is the number
+    of bytes read.
+    '''
+
+    arrays = []
+
+    # (Line endings are kept, so that the lengths of the (ASCII) lines are
+    # their sizes in bytes.)
+    with open(fpath, 'r', newline='') as f:
+
+        # Skip header
+        size = len(f.readline())
+
+        while True:
+            lines = list(itertools.islice(f, chunk_rows))
+            if not lines:
+                break
+
+            size += sum(map(len, lines))
+
+            arr = np.loadtxt(lines, usecols=cols, ndmin=2)
+            if len(arr) == 0:
+                continue
+
+            if (t_min is None) or (arr[-1, 0] >= t_min):
+                arrays.append(arr)
+
+            if (t_max is not None) and (arr[-1, 0] > t_max):
+                break
+
+    if arrays:
+        arr = np.concatenate(arrays)
+    else:
+        arr = np.zeros((0, len(cols)))
+
+    if return_size:
+        return arr, size
+
+    return arr
+
+
+class BETFileIndex(PersistentIndex):
+    '''Index of the creation/modification times of the BET/ISP data files.
+
+    Determining the creation time of a data file involves parsing the
+    timestamp in its filename (see BETDataCollector.get_file_times()). The
+    index stores the result for every file in a folder, along with the size
+    and modification time from the directory listing (os.scandir, which on
+    Windows provides these without a separate stat call for every file).
+    On each update, only files that are new or have changed are parsed
+    again, and files in a time span are then found with an IntervalIndex.
+
+    If index_path is given, the index is stored there (as json, see
+    PersistentIndex). Call save() to write any changes to disk.
+    '''
+
+    description = 'BET file index'
+
+    fmt_string = "%Y-%m-%d %H:%M:%S.%f"
+
+    def get_contents(self):
+        return self.folders
+
+    def set_contents(self, contents):
+
+        self.folders = {} if contents is None else dict(contents)
+        self.intervals = {}
+
+    def update(self, folderpath, get_file_info):
+        '''Brings the index for folderpath up to date with the files in it.
+
+        get_file_info(fpath, stat) should return (ctime, mtime) for a data
+        file, or None if the file is problematic (see
+        BETDataCollector.get_file_info()).'''
+
+        folderpath = str(folderpath)
+
+        entries = self.folders.setdefault(folderpath, {})
+        changed = False
+
+        fnames = set()
+
+        with os.scandir(folderpath) as dir_entries:
+            for dir_entry in dir_entries:
+
+                fname = dir_entry.name
+                fnames.add(fname)
+
+                try:
+                    stat = dir_entry.stat()
+                except OSError:
+                    continue
+
+                entry = entries.get(fname)
+                if (
+                    (entry is not None)
+                    and (entry['size'] == stat.st_size)
+                    and (entry['mtime'] == stat.st_mtime)
+                    and (entry['ctime'] == stat.st_ctime)
+                ):
+                    continue
+
+                file_info = get_file_info(dir_entry.path, stat)
+
+                if file_info is None:
+                    self.logger.warning(
+                        f'Skipping problematic data file "{fname}"'
+                    )
+                    times = None
+                else:
+                    times = [t.strftime(self.fmt_string) for t in file_info]
+
+                entries[fname] = {
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime,
+                    'ctime': stat.st_ctime,
+                    'times': times
+                }
+                changed = True
+
+        for fname in set(entries) - fnames:
+            del entries[fname]
+            changed = True
+
+        if changed:
+            self.intervals.pop(folderpath, None)
+            self.modified = True
+
+    def find(self, folderpath, start_time, end_time):
+        '''Returns a list of (file path, ctime) for every indexed data file in
+        folderpath that was written between start_time and end_time, sorted
+        by ctime.'''
+
+        folderpath = str(folderpath)
+
+        if folderpath not in self.intervals:
+            intervals = []
+            for fname, entry in self.folders.get(folderpath, {}).items():
+                if entry['times'] is None:
+                    continue
+
+                ctime, mtime = [
+                    datetime.datetime.strptime(t, self.fmt_string)
+                    for t in entry['times']
+                ]
+                intervals.append((ctime, mtime, fname))
+
+            self.intervals[folderpath] = IntervalIndex(intervals)
+
+        return [
+            (os.path.join(folderpath, fname), ctime)
+            for ctime, mtime, fname in self.intervals[folderpath].find(
+                start_time, end_time, inclusive=False
+            )
+        ]
@@ -4,7 +4,9 @@ import os
 import logging
 
 # qncmbe imports
-from .utils import DataCollector, DataElement
+from .utils import (
+    DataCollector, DataElement, IntervalIndex, PersistentIndex
+)
 from .data_names import index
 
 # Non-standard library imports (included in setup.py)
@@ -19,8 +21,15 @@ class SVTDataCollector(DataCollector):
 
     default_data_path = "\\\\zw-xp1\\QNC_MBE_Data"
 
-    def __init__(self, start_time, end_time, names, savedir=None):
-        '''See docstring for parent (DataCollector)'''
+    def __init__(
+        self, start_time, end_time, names, savedir=None, folder_index_path=None
+    ):
+        '''See docstring for parent (DataCollector)
+
+        If folder_index_path is given, the time spans of the SVT data folders
+        are stored in this file (see SVTFolderIndex), so that a collection
+        only has to open the folders that overlap the requested times.
+        '''
 
         super().__init__(start_time, end_time, names, savedir)
 
@@ -28,6 +37,29 @@ class SVTDataCollector(DataCollector):
 
         self.main_data_path = self.default_data_path
 
+        self.set_folder_index_path(folder_index_path)
+
+    def set_folder_index_path(self, folder_index_path):
+        '''Set the file used to store the SVT folder time spans (see
+        SVTFolderIndex). If None, every folder is checked on each
+        collection.'''
+
+        if folder_index_path is None:
+            self.folder_index = None
+        else:
+            self.folder_index = SVTFolderIndex(folder_index_path)
+
+    def copy(self):
+        '''See docstring for parent (DataCollector). The copy gets its own
+        folder index (loaded from the same file).'''
+
+        new = super().copy()
+
+        if self.folder_index is not None:
+            new.set_folder_index_path(self.folder_index.index_path)
+
+        return new
+
     def find_bad_data_paths(self):
 
         if os.path.exists(self.main_data_path):
@@ -35,21 +67,24 @@ class SVTDataCollector(DataCollector):
         else:
             return [self.main_data_path]
 
-    def collect_data(self):
+    def find_folders(self):
+        '''Returns a list of (folder path, t_zero) for all SVT data folders
+        with data within the requested time span.'''
 
-        self.initialize_data()
+        if self.folder_index is not None:
+            self.folder_index.update(self.main_data_path)
+            self.folder_index.save()
 
-        # For speed. Skip collection process if no names are requested.
-        if not self.names:
-            return {}
+            return [
+                (fpath, t0) for fpath, t0, ts, te
+                in self.folder_index.find(self.start_time, self.end_time)
+            ]
 
-        if not os.path.exists(self.main_data_path):
-            self.logger.error(
-                f'Cannot find/access data path "{self.main_data_path}"'
-            )
-            return self.data
+        folders = []
 
         for fname in os.listdir(self.main_data_path):
+            self.check_cancelled()
+
             fpath = os.path.join(self.main_data_path, fname)
             if is_SVT_folder(fpath):
 
@@ -65,50 +100,253 @@ class SVTDataCollector(DataCollector):
                     )
                     continue
 
-                f_zero_time = t0
-                f_start_time = ts
-                f_end_time = te
-
                 time_condition = (
-                    (self.end_time >= f_start_time)
-                    and (self.start_time <= f_end_time)
+                    (self.end_time >= ts)
+                    and (self.start_time <= te)
                 )
 
                 if time_condition:
+                    folders.append((fpath, t0))
 
-                    for name in self.names:
-                        postfix = self.parameters[name]['filename']
-                        col = self.parameters[name]['column']
-                        tcol = self.parameters[name]['time_column']
-
-                        basename = None
-                        for bn in os.listdir(fpath):
-                            if bn.endswith(postfix):
-                                basename = bn
-                                break
-
-                        f_arr = read_SVT_data_file(
-                            filepath=os.path.join(fpath, basename),
-                            cols=[tcol, col],
-                            try_increments=True
-                        )
+        return folders
+
+    def collect_data(self):
+
+        self.initialize_data()
 
-                        self.data[name].add_data(
-                            DataElement(
-                                name=name,
-                                datetime0=f_zero_time,
-                                units=index[name].units,
-                                time=f_arr[:, 0]*3600*24,
-                                vals=f_arr[:, 1]
+        # For speed. Skip collection process if no names are requested.
+        if not self.names:
+            return {}
+
+        if not os.path.exists(self.main_data_path):
+            self.logger.error(
+                f'Cannot find/access data path "{self.main_data_path}"'
+            )
+            return self.data
+
+        chunks = {name: [] for name in self.names}
+
+        # Group names by data file, so that each file is only read once
+        file_names = {}
+        for name in self.names:
+            postfix = self.parameters[name]['filename']
+            file_names.setdefault(postfix, []).append(name)
+
+        with self.stage('list folders'):
+            folders = self.find_folders()
+
+        for fpath, f_zero_time in folders:
+            self.check_cancelled()
+
+            basenames = os.listdir(fpath)
+
+            for postfix, names in file_names.items():
+
+                basename = None
+                for bn in basenames:
+                    if bn.endswith(postfix):
+                        basename = bn
+                        break
+
+                cols = []
+                for name in names:
+                    for key in ['time_column', 'column']:
+                        if self.parameters[name][key] not in cols:
+                            cols.append(self.parameters[name][key])
+
+                # (Incremented files are listed here rather than by
+                # read_SVT_data_file(), so that each is counted in the stats)
+                filepaths = get_SVT_data_files(
+                    os.path.join(fpath, basename)
+                )
+
+                f_arrs = []
+                for filepath in filepaths:
+                    with self.stage('read files', files=1):
+                        f_arrs.append(
+                            read_SVT_data_file(
+                                filepath=filepath,
+                                cols=cols,
+                                try_increments=False
                             )
                         )
 
-        for name in self.names:
-            self.data[name].trim(self.start_time, self.end_time)
+                    if self.stats is not None:
+                        self.record(
+                            'read files', bytes=os.path.getsize(filepath)
+                        )
+
+                f_arr = np.concatenate(f_arrs)
+                self.record('read files', samples=f_arr.shape[0]*len(names))
+
+                for name in names:
+                    tcol = cols.index(self.parameters[name]['time_column'])
+                    col = cols.index(self.parameters[name]['column'])
+
+                    chunks[name].append(
+                        DataElement(
+                            name=name,
+                            datetime0=f_zero_time,
+                            units=index[name].units,
+                            time=f_arr[:, tcol]*3600*24,
+                            vals=f_arr[:, col]
+                        )
+                    )
+
+        with self.stage('join'):
+            for name in self.names:
+                self.data[name].add_data_chunks(chunks[name])
+
+        with self.stage('trim'):
+            self.trim_data()
 
         return self.data
 
 
+class SVTFolderIndex(PersistentIndex):
+    '''Persistent index of the time spans of the SVT data folders.
+
+    For each entry in the SVT data directory, the index stores (as json in
+    index_path) the modification time of the entry and, for SVT data
+    folders, the (t_zero, t_start, t_end) from its time_info.txt file.
+
+    The index is updated incrementally. The directory itself is only listed
+    again when its modification time changes (i.e., when folders are added
+    or removed), and only new or modified folders are opened. Folders that
+    are not (yet) valid SVT folders are re-checked on every update, since
+    the SVT software creates the folder before the data files.
+
+    Queries are answered from a list of intervals sorted by start time (see
+    IntervalIndex), so only the folders overlapping the requested times are
+    touched.
+
+    Call save() to write any changes to disk (see PersistentIndex).
+    '''
+
+    description = 'SVT folder index'
+
+    fmt_string = "%Y-%m-%d %H:%M:%S.%f"
+
+    def get_contents(self):
+        return {
+            'root': self.root,
+            'root_mtime': self.root_mtime,
+            'folders': self.folders
+        }
+
+    def set_contents(self, contents):
+
+        if contents is None:
+            contents = {'root': None, 'root_mtime': None, 'folders': {}}
+
+        self.root = contents['root']
+        self.root_mtime = contents['root_mtime']
+        self.folders = dict(contents['folders'])
+
+        self.intervals = None
+
+    def update(self, root):
+        '''Brings the index up to date with the SVT data directory root.
+        Raises IOError if root cannot be accessed.'''
+
+        root = str(root)
+
+        root_mtime = os.stat(root).st_mtime
+
+        if root != self.root:
+            self.root = root
+            self.root_mtime = None
+            self.folders = {}
+            self.intervals = None
+            self.modified = True
+
+        if root_mtime != self.root_mtime:
+            fnames = os.listdir(root)
+
+            for fname in set(self.folders) - set(fnames):
+                del self.folders[fname]
+                self.intervals = None
+
+            self.root_mtime = root_mtime
+            self.modified = True
+        else:
+            fnames = [
+                fname for fname, entry in self.folders.items()
+                if entry['pending']
+            ]
+
+        for fname in fnames:
+            self.update_folder(fname)
+
+    def update_folder(self, fname):
+
+        fpath = os.path.join(self.root, fname)
+
+        try:
+            mtime = os.stat(fpath).st_mtime
+        except OSError:
+            return
+
+        entry = self.folders.get(fname)
+        if (entry is not None) and (entry['mtime'] == mtime):
+            return
+
+        times = None
+        pending = os.path.isdir(fpath)
+
+        if is_SVT_folder(fpath):
+            t = get_SVT_folder_time_info(fpath)
+
+            if any([ti is None for ti in t]):
+                self.logger.warning(
+                    f'Problem with SVT time info. Skipping folder "{fpath}"'
+                )
+            else:
+                times = [ti.strftime(self.fmt_string) for ti in t]
+                pending = False
+
+            # Generating time_info.txt modifies the folder
+            mtime = os.stat(fpath).st_mtime
+
+        self.folders[fname] = {
+            'mtime': mtime,
+            'times': times,
+            'pending': pending
+        }
+
+        self.intervals = None
+        self.modified = True
+
+    def build_intervals(self):
+
+        intervals = []
+        for fname, entry in self.folders.items():
+            if entry['times'] is None:
+                continue
+
+            t0, ts, te = [
+                datetime.datetime.strptime(t, self.fmt_string)
+                for t in entry['times']
+            ]
+            intervals.append((ts, te, (fname, t0)))
+
+        self.intervals = IntervalIndex(intervals)
+
+    def find(self, start_time, end_time):
+        '''Returns a list of (folder path, t_zero, t_start, t_end) for every
+        indexed SVT folder with data between start_time and end_time, sorted
+        by t_start.'''
+
+        if self.intervals is None:
+            self.build_intervals()
+
+        return [
+            (os.path.join(self.root, fname), t0, ts, te)
+            for ts, te, (fname, t0)
+            in self.intervals.find(start_time, end_time)
+        ]
+
+
 def is_SVT_folder(folder):
     '''
     Checks if the given folder is a valid SVT data folder
@@ -273,7 +511,109 @@ def read_SVT_data_file(filepath, cols, try_increments=True):
     switch to a new file if the first one gets too long.
 
     Returns data as-is from the file. E.g., time is given in day fraction
-    rather than seconds
+    rather than seconds. The result is a 2D array with one column per entry
+    in cols.
+    '''
+
+    if try_increments:
+        filepaths = get_SVT_data_files(filepath)
+    else:
+        filepaths = [filepath]
+
+    return np.concatenate(
+        [read_SVT_columns(name, cols) for name in filepaths]
+    )
+
+
+def get_SVT_data_files(filepath):
+    '''Returns a list of filepath followed by any incremented files (e.g.,
+    "G0123_IS4K Refm.txt", "G0123_IS4K Refn.txt", ...) that exist. See
+    read_SVT_data_file().'''
+
+    filepaths = [filepath]
+
+    name = increment_SVT_filename(filepath)
+    while os.path.exists(name):
+        filepaths.append(name)
+        name = increment_SVT_filename(name)
+
+    return filepaths
+
+
+def read_SVT_columns(filepath, cols, chunk_rows=10000):
+    '''
+    Reads the given columns from a single SVT data file (without looking
+    for incremented files).
+
+    The header is skipped by searching for the first line that parses. The
+    rest of the file is parsed by np.loadtxt, chunk_rows lines at a time.
+    Any other unparseable lines (e.g., a partially written last line in a
+    file that is still being written) are dropped (see parse_SVT_lines()).
+    '''
+
+    with open(filepath, 'r') as f:
+        lines = f.readlines()
+
+    for start, line in enumerate(lines):
+        if parse_SVT_line(line, cols) is not None:
+            break
+    else:
+        return np.zeros((0, len(cols)))
+
+    return np.concatenate([
+        parse_SVT_lines(lines[i:i + chunk_rows], cols)
+        for i in range(start, len(lines), chunk_rows)
+    ])
+
+
+def parse_SVT_lines(lines, cols, min_rows=16):
+    '''Parses the given columns of a list of lines from an SVT data file,
+    dropping any lines that can't be parsed. Returns a 2D array with one
+    column per entry in cols.
+
+    The lines are parsed with np.loadtxt. If that fails, they are split in
+    half and each half is parsed again, until the failing parts are at most
+    min_rows lines. Only those are parsed line by line (see
+    parse_SVT_line()). So a few bad lines only cost a few extra loadtxt
+    calls, rather than sending the whole file to Python parsing.
+    '''
+
+    try:
+        return np.loadtxt(lines, usecols=cols, comments=None, ndmin=2)
+    except ValueError:
+        pass
+
+    if len(lines) <= min_rows:
+        data = [parse_SVT_line(line, cols) for line in lines]
+
+        return np.array(
+            [row for row in data if row is not None]
+        ).reshape(-1, len(cols))
+
+    mid = len(lines)//2
+
+    return np.concatenate([
+        parse_SVT_lines(lines[:mid], cols, min_rows),
+        parse_SVT_lines(lines[mid:], cols, min_rows)
+    ])
+
+
+def parse_SVT_line(line, cols):
+    '''Returns the values in columns cols of a line from an SVT data file,
+    or None if the line can't be parsed.'''
+
+    try:
+        split = line.split()
+        return [float(split[i]) for i in cols]
+    except (ValueError, IndexError):
+        return None
+
+
+def read_SVT_data_file_reference(filepath, cols, try_increments=True):
+    '''Reference implementation of read_SVT_data_file().
+
+    Parses every line in Python. Much slower, but kept for testing the
+    vectorized reader against.
     '''
 
     data = []
@@ -5,7 +5,8 @@ from .growths import GrowthDataCollector
 
 
 def get_growth_data(
-    start, end, names, savedir=None, molly_dt=None, force_reload=False
+    start, end, names, savedir=None, molly_dt=None, force_reload=False,
+    collector_options=None
 ):
     '''Main function for getting growth data.
 
@@ -37,6 +38,12 @@ def get_growth_data(
         force_reload
             If savedir is provided, this can be used to ignore any previously
             saved data and force a reload from the lab servers.
+        collector_options
+            Extra options for the collector of each location, e.g., to fetch
+            Molly hours concurrently or to keep an index of the remote files
+            between calls. For example,
+                {"Molly": {"max_workers": 4}}
+            See GrowthDataCollector for details.
 
     Output:
         data
@@ -47,13 +54,45 @@ def get_growth_data(
             data["Al1 tip measured"].vals
     '''
 
-    collector = GrowthDataCollector(start, end, names, savedir, molly_dt)
+    collector = GrowthDataCollector(
+        start, end, names, savedir, molly_dt, collector_options
+    )
 
     data = collector.get_data(force_reload=force_reload)
     
     return data
 
 
+async def get_growth_data_async(
+    start, end, names, savedir=None, molly_dt=None, force_reload=False,
+    collector_options=None, executor=None
+):
+    '''Asynchronous version of get_growth_data(), for use with asyncio.
+
+    Inputs are the same as get_growth_data(). File reads are run in executor
+    (by default, the event loop's default executor). Concurrent requests
+    share a limit on the number of simultaneous collections from each lab
+    computer (see qncmbe.data_import.utils.set_host_limit()). Cancelling the
+    request stops its remote reads.
+
+    E.g., to collect several growths at once:
+        data = await asyncio.gather(
+            get_growth_data_async(start1, end1, names),
+            get_growth_data_async(start2, end2, names)
+        )
+    '''
+
+    collector = GrowthDataCollector(
+        start, end, names, savedir, molly_dt, collector_options
+    )
+
+    data = await collector.get_data_async(
+        force_reload=force_reload, executor=executor
+    )
+
+    return data
+
+
 def get_names_list():
     return index.get_names_list()
 
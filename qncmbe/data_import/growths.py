@@ -1,8 +1,15 @@
 # Standard library imports
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+import time
 from pathlib import Path
 
 # qncmbe imports
-from .utils import DataCollector
+from .utils import (
+    CollectionCancelled, DataCollector, DataElement, add_cancel_event
+)
 from .molly import MollyDataCollector
 from .BET import BETDataCollector
 from .SVT import SVTDataCollector
@@ -17,16 +24,44 @@ class GrowthDataCollector(DataCollector):
     Members:
         locations       A set of all allowed location strings
         subcollectors   dictionary of DataCollectors {location: DataCollector}
+        timeouts        dictionary of timeouts in seconds {location: timeout}
+                        (None means no timeout). See set_timeout().
+        failed_locations
+                        list of the locations for which the last collection
+                        failed (see run_collectors())
+
+    The sub-collectors for each location are run concurrently, since each
+    one is mostly waiting on a different lab computer.
+
+    collector_options can be used to pass extra options to the collector for
+    each location, as a dictionary {location: {option: value}}. E.g.,
+        {
+            "Molly": {"max_workers": 4, "header_index_dir": "..."},
+            "SVT": {"folder_index_path": "..."},
+            "BET": {"file_index_path": "..."}
+        }
+    See MollyDataCollector, SVTDataCollector and BETDataCollector for the
+    available options.
     '''
 
     locations = {"Molly", "BET", "SVT"}
 
     def __init__(
-        self, start_time, end_time, names, savedir=None, molly_dt=None
+        self, start_time, end_time, names, savedir=None, molly_dt=None,
+        collector_options=None
     ):
 
         self.names = names
 
+        if collector_options is None:
+            collector_options = {}
+
+        for location in collector_options:
+            if location not in self.locations:
+                raise ValueError(
+                    f'Invalid location "{location}" in collector_options.'
+                )
+
         # Set up a data collector for each location
         collector_cls = {
             "Molly": MollyDataCollector,
@@ -35,6 +70,8 @@ class GrowthDataCollector(DataCollector):
         }
 
         self.collectors = {}
+        self.timeouts = {}
+        self.failed_locations = []
 
         for location in self.locations:
 
@@ -50,7 +87,10 @@ class GrowthDataCollector(DataCollector):
             if location == "Molly":
                 kwargs['dt'] = molly_dt
 
+            kwargs.update(collector_options.get(location, {}))
+
             self.collectors[location] = collector_cls[location](**kwargs)
+            self.timeouts[location] = None
 
         super().__init__(start_time, end_time, names, savedir)
 
@@ -71,6 +111,15 @@ class GrowthDataCollector(DataCollector):
         for loc in self.locations:
             self.collectors[loc].set_times(*args, **kwargs)
 
+    def set_savedir(self, *args, **kwargs):
+        '''See docstring for parent (DataCollector). The sub-collectors use
+        the same savedir (see get_data_async()).'''
+
+        super().set_savedir(*args, **kwargs)
+
+        for loc in self.locations:
+            self.collectors[loc].set_savedir(*args, **kwargs)
+
     def set_data_path(self, location, path):
         self.collectors[location].main_data_path = path
 
@@ -82,15 +131,233 @@ class GrowthDataCollector(DataCollector):
 
         return bad_paths
 
+    def enable_stats(self, stats=None):
+        '''See docstring for parent (DataCollector). The stats are shared with
+        the sub-collectors.'''
+
+        super().enable_stats(stats)
+
+        for coll in self.collectors.values():
+            coll.enable_stats(self.stats)
+
+        return self.stats
+
+    def disable_stats(self):
+
+        super().disable_stats()
+
+        for coll in self.collectors.values():
+            coll.disable_stats()
+
+    def set_timeout(self, location, timeout):
+        '''Set the maximum time (in seconds) to wait for data from location.
+        If None, waits indefinitely.'''
+        self.timeouts[location] = timeout
+
+    def get_failed_names(self):
+        '''Names from the locations for which the last collection failed.
+        See docstring for parent (DataCollector).'''
+
+        return [
+            name for name in self.names
+            if index[name].location in self.failed_locations
+        ]
+
     def collect_data(self):
+        return self.run_collectors('collect_data')
+
+    def collect_chunk(self):
+        return self.run_collectors('collect_chunk')
+
+    def run_collectors(self, method):
+        '''Runs the given collection method (e.g., 'collect_data') of every
+        sub-collector concurrently, and merges the results into self.data.
+
+        Errors are isolated to each location: if a sub-collector raises an
+        exception or takes longer than its timeout (self.timeouts), the
+        error is logged, the data for that location is left empty, and the
+        location is added to self.failed_locations (so that its empty data
+        is not saved).
+
+        A sub-collector that times out is signalled to stop at the next file
+        it reads (see DataCollector.check_cancelled()), but it may keep
+        running in the background until then. So it is replaced by a copy
+        (see replace_collector()) rather than being used again.
+        '''
 
         self.data = {}
+        self.failed_locations = []
 
-        for loc, coll in self.collectors.items():
-            self.data.update(coll.collect_data())
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(self.collectors)
+        )
+
+        t_start = time.monotonic()
+
+        try:
+            # Each location runs in a copy of the current context, so that
+            # cancellation of an asynchronous collection reaches the
+            # sub-collectors, plus its own event to stop it if it times out
+            events = {}
+            futures = {}
+            for loc, coll in self.collectors.items():
+                events[loc] = threading.Event()
+                context = contextvars.copy_context()
+                context.run(add_cancel_event, events[loc])
+                futures[loc] = executor.submit(
+                    context.run, getattr(coll, method)
+                )
+
+            for loc, future in futures.items():
+
+                # Timeouts are counted from the start, since all locations
+                # run at the same time
+                timeout = self.timeouts[loc]
+                if timeout is not None:
+                    timeout = max(0.0, timeout - (time.monotonic() - t_start))
+
+                try:
+                    self.data.update(future.result(timeout=timeout))
+
+                except concurrent.futures.TimeoutError:
+                    self.logger.error(
+                        f'Timed out collecting {loc} data after'
+                        f' {self.timeouts[loc]} s'
+                    )
+                    events[loc].set()
+                    self.replace_collector(loc)
+                    self.failed_locations.append(loc)
+                    self.data.update(self.empty_location_data(loc))
+
+                except CollectionCancelled:
+                    raise
+
+                except Exception:
+                    self.logger.exception(f'Error collecting {loc} data')
+                    self.failed_locations.append(loc)
+                    self.data.update(self.empty_location_data(loc))
+
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return self.data
+
+    async def collect_data_async(self, executor=None):
+        '''Asynchronous version of collect_data().
+
+        The sub-collectors are awaited concurrently, each within the
+        concurrency limit of its own remote host. Timeouts and errors are
+        handled the same way as in run_collectors().'''
+
+        return await self.run_locations_async(executor)
+
+    async def load_or_collect_async(self, force_reload=False, executor=None):
+        '''See docstring for parent (DataCollector).
+
+        If savedir is set, each sub-collector loads its own saved data (from
+        the same savedir), and only the locations with missing data are
+        collected, each within the concurrency limit of its own remote host.
+        Data for locations that fail is not saved.'''
+
+        if self.savedir is None:
+            return await super().load_or_collect_async(force_reload, executor)
+
+        return await self.run_locations_async(
+            executor, use_savedir=True, force_reload=force_reload
+        )
+
+    async def run_locations_async(
+        self, executor=None, use_savedir=False, force_reload=False
+    ):
+        '''Awaits collect_location_async() for every location concurrently,
+        and merges the results into self.data.'''
+
+        self.failed_locations = []
+
+        results = await asyncio.gather(*[
+            self.collect_location_async(
+                loc, executor, use_savedir, force_reload
+            )
+            for loc in self.collectors
+        ])
+
+        data = {}
+        for location_data in results:
+            data.update(location_data)
+
+        self.data = {name: data[name] for name in self.names}
 
         return self.data
 
+    async def collect_location_async(
+        self, location, executor=None, use_savedir=False, force_reload=False
+    ):
+        '''Collects the data for a single location asynchronously. If
+        use_savedir is True, the sub-collector also loads/saves its data in
+        savedir (see DataCollector.load_or_collect_async()).'''
+
+        coll = self.collectors[location]
+
+        if use_savedir:
+            collection = coll.load_or_collect_async(force_reload, executor)
+        else:
+            collection = coll.collect_data_async(executor=executor)
+
+        try:
+            return await asyncio.wait_for(
+                collection, timeout=self.timeouts[location]
+            )
+
+        except asyncio.TimeoutError:
+            self.logger.error(
+                f'Timed out collecting {location} data after'
+                f' {self.timeouts[location]} s'
+            )
+            # The collection is cancelled, but may still be running
+            self.replace_collector(location)
+
+        except CollectionCancelled:
+            raise
+
+        except Exception:
+            self.logger.exception(f'Error collecting {location} data')
+
+        self.failed_locations.append(location)
+
+        return self.empty_location_data(location)
+
+    def replace_collector(self, location):
+        '''Replaces the sub-collector for location with a copy (see
+        DataCollector.copy()), e.g., after it timed out. Collections which
+        time out may keep running for a while, so the old sub-collector must
+        not be used (or have its times changed, etc.) in the meantime.'''
+
+        self.collectors[location] = self.collectors[location].copy()
+
+    def empty_location_data(self, location):
+        '''Empty DataElements for each name from location.'''
+
+        return {
+            name: DataElement(name, self.start_time, self.units[name])
+            for name in self.collectors[location].names
+        }
+
+    def join_chunks(self, chunks):
+        '''Joins chunks according to the collector for their location.'''
+
+        location = index[chunks[0].name].location
+
+        return self.collectors[location].join_chunks(chunks)
+
+    def trim_data(self):
+        '''Trims each location's data according to its own collector (e.g.,
+        Molly data may be interpolated).'''
+
+        for loc, coll in self.collectors.items():
+            coll.data = {name: self.data[name] for name in coll.names}
+            coll.trim_data()
+            self.data.update(coll.data)
+
     def set_test_mode(self):
         '''Use locally-saved data for speed during testing.'''
 
@@ -1,11 +1,14 @@
 # Standard library imports (not included in setup.py)
 import datetime
+import mmap
 import os
 import re
 import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # qncmbe imports
-from .utils import DataCollector, DataElement
+from .utils import DataCollector, DataElement, PersistentIndex
 from .data_names import index
 
 # Non-standard library imports (included in setup.py)
@@ -19,7 +22,10 @@ class MollyDataCollector(DataCollector):
         "Production Data", "Molly data"
     )
 
-    def __init__(self, start_time, end_time, names, savedir=None, dt=None):
+    def __init__(
+        self, start_time, end_time, names, savedir=None, dt=None,
+        use_mmap=False, header_index_dir=None, max_workers=1
+    ):
         '''See docstring for parent (DataCollector)
 
         Additional parameter dt allows you to set the timestep, in case
@@ -29,11 +35,30 @@ class MollyDataCollector(DataCollector):
         frequently.)
 
         If dt = None, raw data is supplied.
+
+        If use_mmap is True, each binary file is memory-mapped once and the
+        signals are taken as views of the mapped file, rather than seeking
+        and reading separately for every name. This is mostly useful when
+        collecting a large number of names at once.
+
+        If header_index_dir is given, parsed header files are stored in this
+        folder (see MollyHeaderIndex) so that repeated pulls over the same
+        hours don't have to parse the headers again.
+
+        max_workers sets the number of threads used to fetch hour files
+        concurrently. Since reading from the Molly computer is mostly
+        limited by network latency, this can speed up multi-day collections
+        considerably. The default (1) reads the hours one at a time.
         '''
 
         super().__init__(start_time, end_time, names, savedir)
 
         self.dt = dt
+        self.use_mmap = use_mmap
+
+        if max_workers < 1:
+            raise ValueError("Invalid max_workers. Must be >= 1.")
+        self.max_workers = max_workers
 
         if dt is not None:
             if dt <= 0:
@@ -43,6 +68,17 @@ class MollyDataCollector(DataCollector):
 
         self.main_data_path = self.default_data_path
 
+        self.set_header_index_dir(header_index_dir)
+
+    def set_header_index_dir(self, header_index_dir):
+        '''Set the folder used to store parsed Molly headers (see
+        MollyHeaderIndex). If None, header files are parsed every time.'''
+
+        if header_index_dir is None:
+            self.header_index = None
+        else:
+            self.header_index = MollyHeaderIndex(header_index_dir)
+
     def find_bad_data_paths(self):
 
         if os.path.exists(self.main_data_path):
@@ -51,6 +87,11 @@ class MollyDataCollector(DataCollector):
             return [self.main_data_path]
 
     def collect_data(self):
+        return self.collect_hours(self.dt)
+
+    def collect_hours(self, dt):
+        '''Collects the data from the Molly hour files, and trims it (see
+        trim_data()) with timestep dt.'''
 
         self.initialize_data()
 
@@ -83,41 +124,112 @@ class MollyDataCollector(DataCollector):
         '''
         hour -= delta
 
+        hours = []
+        while(hour <= self.end_time + delta):
+            hours.append(hour)
+            hour += delta
+
+        # Hours may be fetched concurrently, but map() always returns them in
+        # time order
+        if self.max_workers == 1:
+            executor = None
+            data_hours = map(self.get_data_from_binary, hours)
+        else:
+            executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            data_hours = executor.map(self.get_data_from_binary, hours)
+
         first = {name: True for name in self.names}
+        chunks = {name: [] for name in self.names}
 
-        while(hour <= self.end_time + delta):
+        try:
+            for data_hour in data_hours:
 
-            data_hour = self.get_data_from_binary(hour)
+                self.check_cancelled()
 
-            # Add data from each element
-            # Have to skip the first data element on all except the first
-            # hour or there will be duplicates
+                # Add data from each element
+                # Have to skip the first data element on all except the first
+                # hour or there will be duplicates
 
-            if first:
                 for name in self.names:
                     if first[name]:
-                        self.data[name].add_data(data_hour[name])
+                        chunks[name].append(data_hour[name])
                         if (len(data_hour[name]) != 0):
                             first[name] = False
                     else:
                         if len(data_hour[name]) != 0:
-                            self.data[name].add_data(data_hour[name][1:])
+                            chunks[name].append(data_hour[name][1:])
 
-            hour += delta
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        with self.stage('join'):
+            for name in self.names:
+                self.data[name].add_data_chunks(chunks[name])
+
+        if self.header_index is not None:
+            self.header_index.save()
+
+        with self.stage('trim'):
+            self.trim_to_timestep(dt)
+
+        return self.data
+
+    def trim_data(self):
+        '''Cleanup data based on start time and end time.
+
+        If self.dt is set, the data is also step-interpolated onto a regular
+        time grid.'''
+
+        self.trim_to_timestep(self.dt)
+
+    def trim_to_timestep(self, dt):
+        '''Same as trim_data(), but with timestep dt instead of self.dt.'''
 
-        # Cleanup data based on start time and end time
         for name in self.names:
             self.data[name].set_datetime0(self.start_time)
 
-            if self.dt is None:
+            if dt is None:
                 self.data[name].trim(
                     self.start_time, self.end_time, include_endpoints=True
                 )
             else:
-                t = self.generate_regular_time(self.dt)
+                t = self.generate_regular_time(dt)
                 self.data[name] = self.data[name].step_interpolate(t)
 
-        return self.data
+    def collect_chunk(self):
+        '''See docstring for parent (DataCollector).
+
+        Chunks are always collected as raw data (as if dt = None). Any
+        interpolation is done after the chunks are joined.'''
+
+        return self.collect_hours(dt=None)
+
+    def copy(self):
+        '''See docstring for parent (DataCollector). The copy gets its own
+        header index (loaded from the same folder).'''
+
+        new = super().copy()
+
+        if self.header_index is not None:
+            new.set_header_index_dir(self.header_index.index_dir)
+
+        return new
+
+    def join_chunks(self, chunks):
+        '''See docstring for parent (DataCollector).
+
+        Molly chunks include step-interpolated endpoints at the chunk
+        boundaries. If these don't change the value, they are removed so that
+        the joined data matches data collected in one go.'''
+
+        joined = super().join_chunks(chunks)
+
+        for n, chunk in enumerate(joined[:-1]):
+            if (len(chunk) >= 2) and (chunk.vals[-1] == chunk.vals[-2]):
+                joined[n] = chunk[:-1]
+
+        return joined
 
     def get_header_path(self, hour):
         '''Find the path for a Molly header file for a given hour (datetime
@@ -151,61 +263,94 @@ class MollyDataCollector(DataCollector):
         (usually means the file is missing or inaccessible.)
         '''
 
+        if self.header_index is not None:
+            return self.get_line_numbers_from_index(hour)
+
         header_path = self.get_header_path(hour)
 
+        hour_str = f"{hour.strftime('%Y-%m-%d')} {hour.strftime('%H')}:00"
+
         total_values = {name: 0 for name in self.names}
         values_offset = {name: 0 for name in self.names}
 
         try:
             header = open(header_path, "r")
         except IOError:
-            self.logger.warning(
-                "Missing Molly header file for "
-                f"{hour.strftime('%Y-%m-%d')} {hour.strftime('%H')}:00"
-            )
+            self.logger.warning(f"Missing Molly header file for {hour_str}")
             return None, None
 
+        if self.stats is not None:
+            self.record(
+                'parse headers', files=1,
+                bytes=os.fstat(header.fileno()).st_size
+            )
+
         try:
-            local_name = {}
-            found = {}
-            regex = {}
+            # Several names could, in principle, share the same local name
+            requested = {}
             for name in self.names:
-                local_name[name] = self.parameters[name]['local_name']
-                found[name] = False
-                regex[name] = re.compile(
-                    r"^DataItem=Name:"
-                    + local_name[name] + ".*?" +
-                    r"TotalValues:([0-9].*?);ValueOffset:([0-9].*?)\s*?\n"
-                )
+                local_name = self.parameters[name]['local_name']
+                requested.setdefault(local_name, []).append(name)
+
+            found = {name: False for name in self.names}
 
             for line in header:
-                for name in self.names:
-                    if local_name[name] in line:  # (Redundant, but faster)
-                        match = regex[name].search(line)
-                        if (match):
-                            total_values[name] = int(match.group(1))
-                            values_offset[name] = int(match.group(2))
-                            if found[name]:
-                                self.logger.error(
-                                    f"Duplicate entries for '{name}'"
-                                    f"{hour.strftime('%Y-%m-%d')} "
-                                    f"{hour.strftime('%H')}:00"
-                                )
-                            else:
-                                found[name] = True
+                item = parse_header_line(line)
+                if item is None:
+                    continue
+
+                local_name, total, offset = item
+
+                for name in requested.get(local_name, []):
+                    total_values[name] = total
+                    values_offset[name] = offset
+                    if found[name]:
+                        self.logger.error(
+                            f"Duplicate entries for '{name}' {hour_str}"
+                        )
+                    else:
+                        found[name] = True
 
             for name in self.names:
                 if not found[name]:
-                    self.logger.debug(
-                        f"Missing '{name}' for "
-                        f"{hour.strftime('%Y-%m-%d')} {hour.strftime('%H')}:00"
-                    )
+                    self.logger.debug(f"Missing '{name}' for {hour_str}")
 
         finally:
             header.close()
 
         return total_values, values_offset
 
+    def get_line_numbers_from_index(self, hour):
+        '''Same as get_line_numbers(), but looks up the header in
+        self.header_index rather than searching the header file directly.'''
+
+        hour_str = f"{hour.strftime('%Y-%m-%d')} {hour.strftime('%H')}:00"
+
+        try:
+            entry = self.header_index.get(self.get_header_path(hour), hour)
+        except IOError:
+            self.logger.warning(f"Missing Molly header file for {hour_str}")
+            return None, None
+
+        total_values = {name: 0 for name in self.names}
+        values_offset = {name: 0 for name in self.names}
+
+        for name in self.names:
+            local_name = self.parameters[name]['local_name']
+
+            if local_name in entry['items']:
+                total_values[name], values_offset[name] = (
+                    entry['items'][local_name]
+                )
+                if local_name in entry['duplicates']:
+                    self.logger.error(
+                        f"Duplicate entries for '{name}' {hour_str}"
+                    )
+            else:
+                self.logger.debug(f"Missing '{name}' for {hour_str}")
+
+        return total_values, values_offset
+
     def get_data_from_binary(self, hour):
         '''
         Gets data from Molly binary files for a single hour.
@@ -233,7 +378,8 @@ class MollyDataCollector(DataCollector):
 
         binary_path = self.get_binary_path(hour)
 
-        total_values, values_offset = self.get_line_numbers(hour)
+        with self.stage('parse headers'):
+            total_values, values_offset = self.get_line_numbers(hour)
 
         datetime0 = hour.replace(hour=0, minute=0, second=0, microsecond=0)
 
@@ -254,29 +400,296 @@ class MollyDataCollector(DataCollector):
             )
             return data_hour
 
-        try:
-            for name in self.names:
-                if (total_values[name] < 0) or (values_offset[name] < 0):
-                    self.logger.error(
-                        f'Invalid total_values or values_offset for "{name}"'
+        values = None
+        binary_map = None
+
+        with self.stage('read binary', files=1):
+            try:
+                if self.use_mmap:
+                    binary_map, values = map_binary_file(binary)
+
+                for name in self.names:
+                    if (total_values[name] < 0) or (values_offset[name] < 0):
+                        self.logger.error(
+                            'Invalid total_values or values_offset for'
+                            f' "{name}"'
+                        )
+                        break
+
+                    if values is None:
+                        time, vals = read_binary_values(
+                            binary, total_values[name], values_offset[name]
+                        )
+                    else:
+                        time, vals = view_binary_values(
+                            values, total_values[name], values_offset[name]
+                        )
+
+                    data_hour[name].set_data(time=time, vals=vals)
+
+                    self.record(
+                        'read binary', bytes=8*len(time), samples=len(time)
                     )
-                    break
 
-                data_hour[name].set_data(
-                    time=np.zeros(total_values[name]),
-                    vals=np.zeros(total_values[name])
+            finally:
+                # The mapping can only be closed once no views of it
+                # remain. (If an exception is in flight, its traceback may
+                # still hold one, in which case the mapping is released on
+                # cleanup instead.)
+                del values
+                if binary_map is not None:
+                    try:
+                        binary_map.close()
+                    except BufferError:
+                        pass
+                binary.close()
+
+        return data_hour
+
+
+class MollyHeaderIndex():
+    '''Persistent index of parsed Molly header files.
+
+    Each header file is parsed once into a table of
+        local_name: (TotalValues, ValueOffset)
+    which is stored (as json) in index_dir. Entries are re-parsed whenever
+    the file size or modification time changes. Headers for past hours never
+    change, so in practice only the current hour is ever re-parsed.
+
+    The index is split into one file per day of headers (see
+    MollyHeaderDayIndex), in index_dir/<year>/<year>-<month>-<day>.json. So
+    a collection only loads the days it covers, and only days with new
+    entries are written again. Days are loaded when first needed, and are
+    dropped from memory once saved.
+
+    Call save() to write any new entries to disk.
+    '''
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self.days = {}
+
+        # Hours may be looked up from several threads (see
+        # MollyDataCollector.collect_data())
+        self.lock = threading.Lock()
+
+    def get_day_index(self, hour):
+
+        day = hour.strftime('%Y-%m-%d')
+
+        with self.lock:
+            if day not in self.days:
+                self.days[day] = MollyHeaderDayIndex(
+                    os.path.join(
+                        self.index_dir, hour.strftime('%Y'), f'{day}.json'
+                    )
                 )
 
-                binary.seek((values_offset[name]+1)*8)
+            return self.days[day]
 
-                for n in range(total_values[name]):
-                    data_hour[name].time[n] = struct.unpack(
-                        'f', binary.read(4))[0]*86400
-                    data_hour[name].vals[n] = struct.unpack(
-                        'f', binary.read(4)
-                    )[0]
+    def save(self):
 
-        finally:
-            binary.close()
+        with self.lock:
+            days = self.days
+            self.days = {}
 
-        return data_hour
+        for day_index in days.values():
+            day_index.save()
+
+    def get(self, header_path, hour):
+        '''Returns the index entry for header_path, the header file for hour
+        (a datetime), parsing the header file if necessary. Raises IOError if
+        the header file cannot be accessed.
+
+        Entries are dictionaries with keys
+            size, mtime     size and modification time of the header file
+            items           {local_name: [total_values, values_offset]}
+            duplicates      list of local names that appear more than once
+        '''
+
+        header_path = str(header_path)
+
+        stat = os.stat(header_path)
+
+        day_index = self.get_day_index(hour)
+
+        entry = day_index.entries.get(header_path)
+
+        if (
+            (entry is not None)
+            and (entry['size'] == stat.st_size)
+            and (entry['mtime'] == stat.st_mtime)
+        ):
+            return entry
+
+        items, duplicates = parse_header_file(header_path)
+
+        entry = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'items': items,
+            'duplicates': duplicates
+        }
+
+        day_index.entries[header_path] = entry
+        day_index.modified = True
+
+        return entry
+
+
+class MollyHeaderDayIndex(PersistentIndex):
+    '''The part of a MollyHeaderIndex for a single day of header files.
+    Entries are keyed by the header path.'''
+
+    description = 'Molly header index'
+
+    def get_contents(self):
+        return self.entries
+
+    def set_contents(self, contents):
+        self.entries = {} if contents is None else dict(contents)
+
+
+header_prefix = 'DataItem=Name:'
+
+header_regex = re.compile(
+    r"TotalValues:([0-9].*?);ValueOffset:([0-9].*?)\s*?$"
+)
+
+
+def parse_header_line(line):
+    '''Parses a single line of a Molly header file. Data item lines look like
+        DataItem=Name:<local_name>;...;TotalValues:<N>;ValueOffset:<M>
+
+    Returns (local_name, total_values, values_offset), or None if the line
+    does not describe a data item.
+    '''
+
+    if not line.startswith(header_prefix):
+        return None
+
+    local_name, _, rest = line[len(header_prefix):].partition(';')
+
+    match = header_regex.search(rest)
+    if not match:
+        return None
+
+    return local_name, int(match.group(1)), int(match.group(2))
+
+
+def parse_header_file(header_path):
+    '''Parses every data item in a Molly header file.
+
+    Returns (items, duplicates), where items is a dictionary
+        {local_name: [total_values, values_offset]}
+    and duplicates is a list of local names that appeared more than once.
+    (For duplicates, the last entry is kept.)
+    '''
+
+    items = {}
+    duplicates = []
+
+    with open(header_path, 'r') as header:
+        for line in header:
+            item = parse_header_line(line)
+            if item is None:
+                continue
+
+            local_name, total, offset = item
+            if local_name in items and local_name not in duplicates:
+                duplicates.append(local_name)
+            items[local_name] = [total, offset]
+
+    return items, duplicates
+
+
+# Each Molly value is stored as a (time, value) pair of little-endian float32.
+# Time is given as a fraction of a day, relative to midnight.
+binary_dtype = np.dtype([('time', '<f4'), ('vals', '<f4')])
+
+
+def read_binary_values(binary, total_values, values_offset):
+    '''Reads a single signal from an open Molly binary file.
+
+    The whole block of total_values (time, value) pairs is read at once and
+    decoded with numpy, which is much faster than unpacking value by value.
+
+    Returns time (in seconds) and vals as numpy arrays.
+    '''
+
+    binary.seek((values_offset + 1)*8)
+
+    block = np.frombuffer(
+        binary.read(total_values*binary_dtype.itemsize),
+        dtype=binary_dtype, count=total_values
+    )
+
+    time = np.multiply(block['time'], 86400, dtype=float)
+    vals = block['vals'].astype(float)
+
+    return time, vals
+
+
+def map_binary_file(binary):
+    '''Memory-maps an open Molly binary file.
+
+    Returns the mmap object and a structured numpy array (dtype binary_dtype)
+    viewing the whole file. Both are None if the file is empty, since empty
+    files cannot be mapped.
+
+    The returned array must be deleted before the mmap object is closed.
+    '''
+
+    size = os.fstat(binary.fileno()).st_size
+
+    if size < binary_dtype.itemsize:
+        return None, None
+
+    binary_map = mmap.mmap(binary.fileno(), 0, access=mmap.ACCESS_READ)
+
+    values = np.frombuffer(
+        binary_map, dtype=binary_dtype, count=size//binary_dtype.itemsize
+    )
+
+    return binary_map, values
+
+
+def view_binary_values(values, total_values, values_offset):
+    '''Equivalent to read_binary_values(), but takes the signal from a
+    memory-mapped file (see map_binary_file()) instead of reading it.
+
+    Nothing is read from the file until the values are converted. The
+    returned arrays are copies, so they remain valid after the mapping is
+    closed.
+    '''
+
+    start = values_offset + 1
+
+    if start + total_values > len(values):
+        raise ValueError("Molly binary file is shorter than expected.")
+
+    block = values[start:start + total_values]
+
+    time = np.multiply(block['time'], 86400, dtype=float)
+    vals = block['vals'].astype(float)
+
+    return time, vals
+
+
+def read_binary_values_reference(binary, total_values, values_offset):
+    '''Reference implementation of read_binary_values().
+
+    Unpacks the values one at a time with struct. Much slower, but kept
+    for testing the bulk decoder against.
+    '''
+
+    time = np.zeros(total_values)
+    vals = np.zeros(total_values)
+
+    binary.seek((values_offset + 1)*8)
+
+    for n in range(total_values):
+        time[n] = struct.unpack('<f', binary.read(4))[0]*86400
+        vals[n] = struct.unpack('<f', binary.read(4))[0]
+
+    return time, vals
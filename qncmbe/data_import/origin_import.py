@@ -182,6 +182,11 @@ class QPlainTextEditHandler(logging.Handler):
 
 
 class OriginImportGui(QtWidgets.QMainWindow, Ui_MainWindow):
+
+    # Local folder for the indexes of the remote data files, which let
+    # repeated imports skip parsing the same files again
+    index_dir = os.path.join(Path.home(), '.qncmbe', 'data_import_index')
+
     def __init__(
         self, template_file=None, start_time=None, end_time=None,
         parent=None, test_mode=False
@@ -278,6 +283,32 @@ class OriginImportGui(QtWidgets.QMainWindow, Ui_MainWindow):
 
         self.end_time_edit.setDateTime(self.end_time)
 
+    def get_collector_options(self):
+        '''Options for the collector of each location (see
+        GrowthDataCollector). The GUI always collects every name, so Molly
+        hours are fetched concurrently and memory-mapped, and the remote
+        files are indexed locally (separately for test mode).'''
+
+        index_dir = self.index_dir
+        if self.test_mode:
+            index_dir = os.path.join(index_dir, 'test')
+
+        return {
+            "Molly": {
+                'max_workers': 4,
+                'use_mmap': True,
+                'header_index_dir': os.path.join(index_dir, 'Molly headers')
+            },
+            "SVT": {
+                'folder_index_path': os.path.join(
+                    index_dir, 'SVT folders.json'
+                )
+            },
+            "BET": {
+                'file_index_path': os.path.join(index_dir, 'BET files.json')
+            }
+        }
+
     def get_save_folder(self):
         return os.path.dirname(self.save_file)
 
@@ -544,12 +575,16 @@ class OriginImportGui(QtWidgets.QMainWindow, Ui_MainWindow):
         collector = GrowthDataCollector(
             start_time=self.start_time,
             end_time=self.end_time,
-            names=full_names_list
+            names=full_names_list,
+            collector_options=self.get_collector_options()
         )
 
         if self.test_mode:
             collector.set_test_mode()
 
+        # Record where the time goes, so that slow imports can be diagnosed
+        stats = collector.enable_stats()
+
         if not self.do_empty_data:
             if not self.check_connections(collector):
                 self.clear_file_logger()
@@ -580,6 +615,12 @@ class OriginImportGui(QtWidgets.QMainWindow, Ui_MainWindow):
 
             if self.do_empty_data:
                 data = collector.initialize_data()
+            else:
+                # All locations are collected at once, since the
+                # GrowthDataCollector runs them concurrently
+                collector.get_data()
+                data = collector.data
+                self.add_runtime_message("Done collecting data.")
 
             wkbk_names = {
                 "Molly": "MollyData",
@@ -591,17 +632,6 @@ class OriginImportGui(QtWidgets.QMainWindow, Ui_MainWindow):
 
                 names = index.get_names_list(loc)
 
-                if not self.do_empty_data:
-                    tcol = tm.time()
-                    self.add_runtime_message(f'Collecting {loc} data...')
-                    collector.set_names(names)
-                    collector.get_data()
-                    data = collector.data
-                    dt = tm.time() - tcol
-                    self.add_runtime_message(
-                        f"Done collecting {loc} data. ({dt:.4f} s)"
-                    )
-
                 twrite = tm.time()
                 self.add_runtime_message(f"Writing {loc} data to Origin...")
 
@@ -682,10 +712,15 @@ class OriginImportGui(QtWidgets.QMainWindow, Ui_MainWindow):
 
                 self.origin.Execute('page.active = 1')
 
-                dt = tm.time() - twrite
-                self.add_runtime_message(
-                    f"Done writing {loc} data to Origin. ({dt:.4f} s)"
+                stats.add(
+                    f'{self.__class__.__name__}: write {loc} data',
+                    time=tm.time() - twrite, calls=1
                 )
+                self.add_runtime_message(f"Done writing {loc} data to Origin.")
+
+            self.add_runtime_message(
+                'Timing by stage:\n' + stats.format_report()
+            )
 
             # Write start and end dates to ImportInfo table
             if not self.origin.Execute('win -a ImportInfo'):
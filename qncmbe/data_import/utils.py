@@ -1,8 +1,18 @@
 # Standard library imports (not included in setup.py)
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import copy
 import datetime
+import json
 import os
 import re
+import tempfile
+import threading
+import weakref
 from copy import deepcopy
+from time import perf_counter
 import textwrap
 import logging
 
@@ -15,6 +25,27 @@ import matplotlib.dates as mdates
 from dateutil import parser as date_parser
 
 
+class CollectionCancelled(Exception):
+    '''Raised inside a DataCollector when an asynchronous collection is
+    cancelled (see DataCollector.run_async()).'''
+    pass
+
+
+# Set (in the context of a single asynchronous collection) to a tuple of
+# threading.Events, any of which signals cancellation. See add_cancel_event()
+# and DataCollector.run_async().
+cancel_events = contextvars.ContextVar('cancel_events', default=())
+
+# Limits on the number of concurrent asynchronous collections per remote host.
+# See set_host_limit().
+default_host_limit = 4
+host_limits = {}
+
+# asyncio.Semaphores can only be used within a single event loop, so they are
+# stored separately for each loop: {loop: {host: semaphore}}
+host_semaphores = weakref.WeakKeyDictionary()
+
+
 class DataElement():
     '''Generic container for time-dependent data.
 
@@ -25,7 +56,7 @@ class DataElement():
         datetime0       datetime at which t=0
         units           string giving units of the data array
 
-    Provides method for saving to csv and re-loading.
+    Provides methods for saving (binary or csv) and re-loading.
 
     Slicing (e.g., "my_data_element[2:3]") will return a copy of the
     DataElement with both time and vals sliced appropriately.
@@ -67,37 +98,91 @@ class DataElement():
         keeping the existing data.)
 
         Automatically ensures that times are consistent based on the datetime0
-        of each element. Also sorts so that time is sequential.'''
+        of each element. Also merges the data so that time is sequential.'''
 
         if (self.name != other.name) or (self.units != other.units):
             raise ValueError("Incompatible DataElement for addition")
 
-        original_datetime0 = deepcopy(self.datetime0)
+        time = other.time + (other.datetime0 - self.datetime0).total_seconds()
+
+        # Both time arrays are already sorted, so they only need to be merged.
+        # (In the common case, other simply comes after self.)
+        if (
+            (len(self.time) == 0) or (len(time) == 0)
+            or (time[0] >= self.time[-1])
+        ):
+            self.set_data(
+                time=np.concatenate((self.time, time)),
+                vals=np.concatenate((self.vals, other.vals)),
+                assume_sorted=True
+            )
+        else:
+            # (np.insert casts to the dtype of its first argument, so e.g.
+            # float values inserted into an int array would be truncated.)
+            time_dtype = np.result_type(self.time, time)
+            vals_dtype = np.result_type(self.vals, other.vals)
+            inds = np.searchsorted(self.time, time, side='right')
+            self.set_data(
+                time=np.insert(
+                    self.time.astype(time_dtype, copy=False), inds, time
+                ),
+                vals=np.insert(
+                    self.vals.astype(vals_dtype, copy=False), inds,
+                    other.vals
+                ),
+                assume_sorted=True
+            )
+
+    def add_data_chunks(self, others):
+        '''Add data from a list of DataElements to the present DataElement.
+
+        Equivalent to calling add_data() for each element of others, but the
+        arrays are concatenated only once. If the chunks are already in time
+        order (e.g., consecutive hours of data), no sorting is done.'''
+
+        others = list(others)
 
-        # Move datetime0 so time arrays are compatible
-        self.set_datetime0(other.datetime0)
+        for other in others:
+            if (self.name != other.name) or (self.units != other.units):
+                raise ValueError("Incompatible DataElement for addition")
 
-        self.set_data(
-            time=np.append(self.time, other.time),
-            vals=np.append(self.vals, other.vals)
+        time = np.concatenate(
+            [self.time] + [
+                other.time
+                + (other.datetime0 - self.datetime0).total_seconds()
+                for other in others
+            ]
         )
+        vals = np.concatenate([self.vals] + [other.vals for other in others])
+
+        self.time = time
+        self.vals = vals
+
+        if not is_sorted(self.time):
+            self.sort()
 
-        # Move back datetime0
-        self.set_datetime0(original_datetime0)
+    def set_data(self, time, vals, assume_sorted=False):
+        '''Set the time and vals members, and also sort them.
 
-    def set_data(self, time, vals):
-        '''Set the time and vals members, and also sort them'''
+        The (O(n log n)) sort is skipped if time is already ascending. If
+        assume_sorted is True, even the (O(n)) check is skipped, so time
+        *must* already be ascending.
+
+        time and vals are not copied if they are already numpy arrays, so
+        they should not be modified in-place afterwards.'''
 
         if len(time) != len(vals):
             raise ValueError("time and vals must have the same length.")
 
-        self.time = np.array(time)
-        self.vals = np.array(vals)
-        self.sort()
+        self.time = np.asarray(time)
+        self.vals = np.asarray(vals)
+
+        if not (assume_sorted or is_sorted(self.time)):
+            self.sort()
 
     def sort(self):
         '''Sort both time and vals so that the time array is ascending'''
-        mask = np.argsort(self.time)
+        mask = np.argsort(self.time, kind='stable')
         self.time = self.time[mask]
         self.vals = self.vals[mask]
 
@@ -130,7 +215,7 @@ class DataElement():
             di = self.step_interpolate(ti)
             df = self.step_interpolate(tf)
 
-        self.set_data(self.time[mask], self.vals[mask])
+        self.set_data(self.time[mask], self.vals[mask], assume_sorted=True)
 
         if include_endpoints:
             self.add_data(di)
@@ -142,7 +227,7 @@ class DataElement():
         if not np.isscalar(scalar):
             raise ValueError("Must be scalar.")
 
-        self.vals *= scalar
+        self.vals = self.vals*scalar
 
     def step_interpolate(self, ti, right=False):
         '''Step-interpolates the current DataElement at time values ti, and
@@ -191,14 +276,69 @@ class DataElement():
 
     def set_datetime0(self, datetime0):
 
-        self.time += (self.datetime0 - datetime0).total_seconds()
+        # (Not done in-place, since time may be a read-only memory map)
+        self.time = self.time + (self.datetime0 - datetime0).total_seconds()
         self.datetime0 = datetime0
 
-    def save(self, savedir):
+    def save(self, savedir, fmt='npy'):
+        '''Save to savedir.
+
+        fmt can be
+            'npy'   binary format (default). The data is saved as a 2xN numpy
+                    array in "<name>.npy", and datetime0/units are saved in a
+                    small header file "<name>.json". Much faster to load, and
+                    can be memory-mapped.
+            'dat'   text (csv) format, in "<name>.dat". Slow to load for large
+                    data sets, but useful for exporting.
+
+        Any files previously saved in the other format are removed, so that
+        load() can't pick up stale data.
+        '''
 
         if not os.path.exists(savedir):
             os.makedirs(savedir)
 
+        if fmt == 'npy':
+            self.save_binary(savedir)
+            stale = ['.dat']
+        elif fmt == 'dat':
+            self.save_text(savedir)
+            # Header first, so a partly removed binary save is never loaded
+            stale = ['.json', '.npy']
+        else:
+            raise ValueError(f'Invalid save format "{fmt}".')
+
+        for ext in stale:
+            fname = os.path.join(savedir, self.get_fname(ext))
+            if os.path.exists(fname):
+                os.remove(fname)
+
+    def save_binary(self, savedir):
+
+        datetime0_str = self.datetime0.strftime(r'%Y-%m-%d %H:%M:%S.%f')
+
+        np.save(
+            os.path.join(savedir, self.get_fname('.npy')),
+            np.vstack((self.time, self.vals)).astype(float)
+        )
+
+        # Header is written last, so that it only exists if the save is
+        # complete
+        with open(
+            os.path.join(savedir, self.get_fname('.json')), 'w',
+            encoding='utf-8'
+        ) as f:
+            json.dump(
+                {
+                    'name': self.name,
+                    'units': self.units,
+                    'datetime0': datetime0_str
+                },
+                f
+            )
+
+    def save_text(self, savedir):
+
         datetime0_str = self.datetime0.strftime(r'%Y-%m-%d %H:%M:%S.%f')
 
         fname = os.path.join(savedir, self.get_fname())
@@ -214,7 +354,47 @@ class DataElement():
             delimiter=',', encoding='utf-8-sig'
         )
 
-    def load(self, savedir):
+    def load(self, savedir, mmap_mode=None):
+        '''Load from savedir, previously saved with save().
+
+        The binary format is used if available. Otherwise, falls back to
+        the text format. (E.g., for data saved by older versions.)
+
+        If mmap_mode is given (e.g., 'r' or 'c'), binary data is
+        memory-mapped rather than read into memory. See numpy.load().
+
+        Returns the format that was loaded ('npy' or 'dat'). Raises
+        FileNotFoundError if neither is available.
+        '''
+
+        if os.path.exists(os.path.join(savedir, self.get_fname('.json'))):
+            self.load_binary(savedir, mmap_mode)
+            return 'npy'
+        else:
+            self.load_text(savedir)
+            return 'dat'
+
+    def load_binary(self, savedir, mmap_mode=None):
+
+        with open(
+            os.path.join(savedir, self.get_fname('.json')), 'r',
+            encoding='utf-8'
+        ) as f:
+            header = json.load(f)
+
+        self.datetime0 = datetime.datetime.strptime(
+            header['datetime0'], r'%Y-%m-%d %H:%M:%S.%f'
+        )
+        self.units = header['units']
+
+        fdata = np.load(
+            os.path.join(savedir, self.get_fname('.npy')), mmap_mode=mmap_mode
+        )
+
+        self.time = fdata[0]
+        self.vals = fdata[1]
+
+    def load_text(self, savedir):
 
         fname = os.path.join(savedir, self.get_fname())
 
@@ -244,8 +424,8 @@ class DataElement():
             self.time = fdata[:, 0]
             self.vals = fdata[:, 1]
 
-    def get_fname(self):
-        return f'{self.name}.dat'
+    def get_fname(self, ext='.dat'):
+        return f'{self.name}{ext}'
 
     def plot(self, fig, ax, use_dates=True, **kwargs):
         '''Plot data of DataElement on a matplotlib figure.
@@ -314,6 +494,8 @@ class DataCollector():
 
         self.logger = logging.getLogger(self.__class__.__name__)
 
+        self.stats = None
+
         self.set_times(start_time, end_time, clear_data=False)
 
         if self.end_time <= self.start_time:
@@ -326,6 +508,17 @@ class DataCollector():
 
         self.set_savedir(savedir)
 
+    def copy(self):
+        '''Returns a new collector with the same settings (times, names,
+        data path, etc.), but its own data. Child classes should override
+        this to give the copy its own copy of any other state that is
+        modified during collection.'''
+
+        new = copy.copy(self)
+        new.initialize_data()
+
+        return new
+
     def initialize_data(self):
 
         self.data = {}
@@ -346,8 +539,24 @@ class DataCollector():
 
         self.initialize_data()
 
-    def set_savedir(self, savedir):
+    def set_savedir(
+        self, savedir, save_format='npy', mmap_mode=None, cache_chunk=None
+    ):
+        '''Set the local save directory (see get_data()).
+
+        save_format and mmap_mode control how the data is saved and loaded
+        (see DataElement.save() and DataElement.load()).
+
+        If cache_chunk is given (a timedelta, e.g., one hour or one day), data
+        is saved in fixed time chunks rather than for the exact start/end
+        times. Any time range can then be assembled from previously-saved
+        chunks, and only the missing chunks are collected from the remote
+        source. (See get_chunked_data().)'''
+
         self.savedir = savedir
+        self.save_format = save_format
+        self.mmap_mode = mmap_mode
+        self.cache_chunk = cache_chunk
 
     def set_times(self, start_time, end_time, clear_data=True):
         self.start_time = parse_datetime(start_time)
@@ -364,9 +573,41 @@ class DataCollector():
 
     def collect_data(self):
         '''Collect data from remote source. Must be filled in for child class.
+
+        Child classes should call self.trim_data() once the data is collected.
         '''
         return self.data
 
+    def trim_data(self):
+        '''Trim the collected data to the range start_time, end_time.
+
+        Child classes should override this if they do other post-processing
+        (e.g., interpolation) after collection. It is also used to
+        post-process data assembled from saved chunks (see
+        get_chunked_data()).'''
+
+        for name in self.names:
+            self.data[name].trim(self.start_time, self.end_time)
+
+    def get_failed_names(self):
+        '''Returns a list of the names for which the last collection failed
+        (e.g., because a remote computer could not be reached). Their data is
+        not saved to savedir, so that it is collected again next time.
+
+        Child classes which can fail for only some names should override
+        this.'''
+        return []
+
+    def collect_chunk(self):
+        '''Collect data for a single cache chunk (see get_chunked_data()).
+
+        The data should only be trimmed, with no other post-processing, so
+        that chunks can be joined together and post-processed afterwards.
+        Child classes should override this if collect_data() does more than
+        trim_data().'''
+
+        return self.collect_data()
+
     def check_data(self):
         '''Ensure that data dictionary follows the correct format.
         - keys correspond to DataCollector.names
@@ -401,8 +642,9 @@ class DataCollector():
         '''Get data. Uses the collect_data() method to collect from remote
         source. If self.savedir is set, will automatically save/load from
         this local folder so that the remote data only has to be accessed
-        once.
-        
+        once. (If self.cache_chunk is set, the local data is saved in time
+        chunks. See get_chunked_data().)
+
         Data is returned as a dictionary of DataElements. Dictionary keys
         correspond to the names list given to the DataCollector class.
 
@@ -410,29 +652,374 @@ class DataCollector():
         of the DataCollector
         '''
 
-        if self.savedir is None:
-            self.collect_data()
-        else:
-            if force_reload:
+        with self.stage('get_data'):
+            if self.savedir is None:
                 self.collect_data()
-                self.save_data()
+            elif self.cache_chunk is not None:
+                self.get_chunked_data(force_reload=force_reload)
             else:
-                try:
-                    self.load_data()
-                    self.logger.info("Loaded from local save data.")
-
-                except FileNotFoundError:
-                    self.logger.info(
-                        "Local save data unavailable or incomplete."
-                        " Loading from remote source..."
-                    )
+                if force_reload:
                     self.collect_data()
                     self.save_data()
+                else:
+                    missing = self.load_available_data()
+
+                    if not missing:
+                        self.logger.info("Loaded from local save data.")
+
+                    elif len(missing) == len(self.names):
+                        self.logger.info(
+                            "Local save data unavailable."
+                            " Loading from remote source..."
+                        )
+                        self.collect_data()
+                        self.save_data()
+
+                    else:
+                        self.logger.info(
+                            "Local save data incomplete. Loading"
+                            f" {len(missing)} missing name(s) from remote"
+                            " source..."
+                        )
+                        self.collect_subset(missing)
+                        self.save_data(missing)
 
         self.check_data()
 
+        self.log_stats()
+
+        return self.data
+
+    def enable_stats(self, stats=None):
+        '''Start recording where time goes during collection (see
+        CollectionStats). Stages are recorded under the class name of the
+        collector, e.g. "MollyDataCollector: read binary".
+
+        A CollectionStats can be given to share it between collectors.
+        Otherwise, a new one is created (so calling this again starts a new
+        record). Returns the CollectionStats.'''
+
+        self.stats = CollectionStats() if stats is None else stats
+
+        return self.stats
+
+    def disable_stats(self):
+        self.stats = None
+
+    def get_stats(self):
+        '''Returns the recorded stats (see CollectionStats.report()), or None
+        if they are not enabled.'''
+
+        if self.stats is None:
+            return None
+
+        return self.stats.report()
+
+    def log_stats(self):
+        '''Logs the recorded stats as a table (if they are enabled).'''
+
+        if self.stats is not None:
+            self.logger.info(
+                'Collection stats:\n' + self.stats.format_report()
+            )
+
+    def stage(self, name, **counts):
+        '''Context manager which records the time spent in a stage of the
+        collection (plus any counts, see CollectionStats.add()). Does nothing
+        unless stats are enabled. E.g.,
+            with self.stage('read files', files=1):
+                ...
+        '''
+
+        if self.stats is None:
+            return contextlib.nullcontext()
+
+        return self.stats.stage(f'{self.__class__.__name__}: {name}', **counts)
+
+    def record(self, name, **counts):
+        '''Adds counts (files, bytes, samples) to a stage, if stats are
+        enabled. See CollectionStats.add().'''
+
+        if self.stats is not None:
+            self.stats.add(f'{self.__class__.__name__}: {name}', **counts)
+
+    def collect_subset(self, names, collect=None):
+        '''Collect data from the remote source for a subset of self.names
+        only (e.g., names missing from the local save data). Data for the
+        other names is left as-is.
+
+        collect is the collection method to use. (Default is
+        self.collect_data.)
+
+        Returns a dictionary of the newly-collected DataElements.
+        '''
+
+        if collect is None:
+            collect = self.collect_data
+
+        all_names = self.names
+        data = self.data
+
+        # Temporarily narrow the names, so only the subset is collected
+        self.set_names(names)
+        try:
+            new_data = collect()
+        finally:
+            self.set_names(all_names)
+
+        data.update(new_data)
+        self.data = {name: data[name] for name in all_names}
+
+        return new_data
+
+    def iter_chunks(
+        self, chunk=datetime.timedelta(hours=6), force_reload=False
+    ):
+        '''Iterates over the range start_time to end_time in consecutive time
+        windows of length chunk (a timedelta). For each window, yields a data
+        dictionary like the one returned by get_data().
+
+        This lets long time ranges be processed in bounded memory, and
+        results can be produced before the whole range has been read. E.g.,
+            for data in collector.iter_chunks(datetime.timedelta(days=1)):
+                process(data)
+
+        Notes:
+            - The datetime0 of each DataElement is the start of its window
+            - Each window includes the data at its start time, but not at its
+              end time (except for the last window). So the windows can be
+              joined (e.g., with DataElement.add_data_chunks()) without
+              duplicate points. Step data (e.g., from Molly) includes the
+              step value at the start of each window.
+            - For interpolated Molly data (dt is set), chunk should be a
+              multiple of dt so that the time grids line up.
+            - If savedir is set, each window is saved/loaded separately
+        '''
+
+        start_time = self.start_time
+        end_time = self.end_time
+
+        window_start = start_time
+
+        try:
+            while window_start < end_time:
+                window_end = min(window_start + chunk, end_time)
+
+                self.set_times(window_start, window_end)
+                data = self.get_data(force_reload=force_reload)
+
+                if window_end < end_time:
+                    t_end = (window_end - window_start).total_seconds()
+                    for name in self.names:
+                        element = data[name]
+                        data[name] = element[element.time < t_end]
+
+                yield data
+
+                window_start = window_end
+        finally:
+            self.set_times(start_time, end_time)
+
+    async def get_data_async(self, force_reload=False, executor=None):
+        '''Asynchronous version of get_data().
+
+        Collection from the remote source (and any loading/saving of local
+        data) is run in executor (by default, the event loop's default
+        executor). Requests to the same remote host share a concurrency
+        limit (see set_host_limit()). If the task is cancelled, the
+        collection stops at the next file it would read, and nothing is
+        saved.
+        '''
+
+        with self.stage('get_data'):
+            await self.load_or_collect_async(force_reload, executor)
+
+        self.check_data()
+
+        self.log_stats()
+
+        return self.data
+
+    async def load_or_collect_async(self, force_reload=False, executor=None):
+        '''Same as get_data_async(), without checking the data and logging
+        the stats afterwards.
+
+        Data saved in savedir is loaded outside of the concurrency limit for
+        the remote host, which only applies to collecting the missing names.
+        (For a chunked cache, the whole collection is run within the limit.)
+        '''
+
+        loop = asyncio.get_running_loop()
+
+        if self.savedir is None:
+            await self.collect_data_async(executor=executor)
+
+        elif self.cache_chunk is not None:
+            await self.run_async(
+                self.get_chunked_data, force_reload, executor=executor
+            )
+
+        else:
+            if force_reload:
+                missing = list(self.names)
+            else:
+                missing = await loop.run_in_executor(
+                    executor, self.load_available_data
+                )
+
+            if missing:
+                await self.run_async(
+                    self.collect_subset, missing, executor=executor
+                )
+                await loop.run_in_executor(executor, self.save_data, missing)
+
+        return self.data
+
+    async def collect_data_async(self, executor=None):
+        '''Asynchronous version of collect_data(). See get_data_async().'''
+        return await self.run_async(self.collect_data, executor=executor)
+
+    async def run_async(self, func, *args, executor=None):
+        '''Runs func(*args) in executor, within the concurrency limit for
+        this collector's remote host.
+
+        If the calling task is cancelled, func is signalled to stop via
+        check_cancelled().'''
+
+        loop = asyncio.get_running_loop()
+
+        event = threading.Event()
+        context = contextvars.copy_context()
+        context.run(add_cancel_event, event)
+
+        async with get_host_semaphore(self.get_host()):
+            try:
+                return await loop.run_in_executor(
+                    executor, context.run, func, *args
+                )
+            except asyncio.CancelledError:
+                event.set()
+                raise
+
+    def check_cancelled(self):
+        '''Raises CollectionCancelled if the current asynchronous collection
+        has been cancelled. Collectors should call this before each remote
+        read. (Does nothing for synchronous collections.)'''
+
+        if any(event.is_set() for event in cancel_events.get()):
+            raise CollectionCancelled(
+                f'{self.__class__.__name__} collection cancelled.'
+            )
+
+    def get_host(self):
+        '''Name of the remote host that data is collected from (used for
+        concurrency limits). See get_host().'''
+        return get_host(getattr(self, 'main_data_path', ''))
+
+    def get_chunked_data(self, force_reload=False):
+        '''Get data using a cache of fixed time chunks (self.cache_chunk).
+
+        The requested range is split into chunks aligned to multiples of
+        self.cache_chunk. Each chunk is loaded from
+            <savedir>/chunks/<chunk start>_to_<chunk end>/
+        if available, and otherwise collected from the remote source and
+        saved there. (Chunks which are not yet over are never saved, since
+        their data is incomplete.) The chunks are then joined and trimmed to
+        the requested range with trim_data().
+
+        So, e.g., a request which overlaps with previous requests only
+        collects the parts which have not been collected before.
+        '''
+
+        start_time = self.start_time
+        end_time = self.end_time
+
+        chunks = {name: [] for name in self.names}
+        num_loaded = 0
+        num_collected = 0
+
+        try:
+            for chunk_start, chunk_end in self.generate_cache_chunks():
+                self.set_times(chunk_start, chunk_end)
+
+                subdir = os.path.join(
+                    self.savedir, 'chunks', self.generate_save_subdirname()
+                )
+
+                if force_reload:
+                    missing = self.names
+                else:
+                    missing = []
+                    with self.stage('load saved data'):
+                        for name in self.names:
+                            try:
+                                self.data[name].load(
+                                    subdir, mmap_mode=self.mmap_mode
+                                )
+                            except FileNotFoundError:
+                                missing.append(name)
+
+                if not missing:
+                    num_loaded += 1
+                else:
+                    new_data = self.collect_subset(missing, self.collect_chunk)
+                    num_collected += 1
+
+                    failed = self.get_failed_names()
+                    to_save = [name for name in missing if name not in failed]
+
+                    if chunk_end <= datetime.datetime.now():
+                        with self.stage('save data', files=len(to_save)):
+                            for name in to_save:
+                                new_data[name].save(
+                                    subdir, fmt=self.save_format
+                                )
+
+                for name in self.names:
+                    chunks[name].append(self.data[name])
+
+        finally:
+            self.set_times(start_time, end_time)
+
+        self.logger.info(
+            f"Loaded {num_loaded} chunk(s) from local save data and"
+            f" collected {num_collected} chunk(s) from remote source."
+        )
+
+        with self.stage('join'):
+            for name in self.names:
+                self.data[name].add_data_chunks(
+                    self.join_chunks(chunks[name])
+                )
+
+        with self.stage('trim'):
+            self.trim_data()
+
         return self.data
 
+    def join_chunks(self, chunks):
+        '''Prepares a list of consecutive chunks of a single DataElement for
+        joining. See join_chunks().'''
+        return join_chunks(chunks)
+
+    def generate_cache_chunks(self):
+        '''Returns a list of (chunk_start, chunk_end) tuples covering the
+        range start_time to end_time. Chunks are aligned to multiples of
+        self.cache_chunk (counted from datetime.datetime.min), so that they
+        are the same for any requested range.'''
+
+        epoch = datetime.datetime.min
+
+        n = (self.start_time - epoch)//self.cache_chunk
+        chunk_start = epoch + n*self.cache_chunk
+
+        chunks = []
+        while chunk_start < self.end_time:
+            chunks.append((chunk_start, chunk_start + self.cache_chunk))
+            chunk_start += self.cache_chunk
+
+        return chunks
+
     def generate_regular_time(self, dt):
         '''Generate evenly spaced time array.
 
@@ -452,8 +1039,9 @@ class DataCollector():
 
         return f'{ti_str}_to_{tf_str}'
 
-    def save_data(self):
-        '''Save all data arrays to csv files.
+    def save_data(self, names=None):
+        '''Save data arrays, in the format given by self.save_format
+        (see DataElement.save()). If names is None, all data is saved.
 
         These are placed in self.savedir, in a subdirectory automatically
         generated based on the start and end timestamps
@@ -461,20 +1049,71 @@ class DataCollector():
         if self.savedir is None:
             raise ValueError("savedir not set.")
 
+        if names is None:
+            names = self.names
+
+        failed = self.get_failed_names()
+        if failed:
+            self.logger.warning(
+                f'Not saving data for {", ".join(failed)}, since the'
+                ' collection failed.'
+            )
+            names = [name for name in names if name not in failed]
+
         subdir = os.path.join(self.savedir, self.generate_save_subdirname())
-        for name, data_element in self.data.items():
-            data_element.save(subdir)
+        with self.stage('save data', files=len(names)):
+            for name in names:
+                self.data[name].save(subdir, fmt=self.save_format)
 
     def load_data(self):
-        '''Loads data from csvs. self.savedir must be set, and self.save_data()
-        must have been called previously.'''
+        '''Loads saved data. self.savedir must be set, and self.save_data()
+        must have been called previously.
+
+        Data saved in the old text (csv) format can also be loaded. If
+        self.save_format is 'npy', it is converted to the binary format so
+        that it loads faster next time.
+
+        If self.mmap_mode is set, binary data is memory-mapped (see
+        DataElement.load()).
+
+        Raises FileNotFoundError if any of the names are missing from the
+        saved data.'''
+
+        missing = self.load_available_data()
+
+        if missing:
+            raise FileNotFoundError(
+                f'No saved data for {", ".join(missing)}'
+            )
+
+    def load_available_data(self):
+        '''Same as load_data(), but names missing from the saved data are
+        skipped rather than raising an error.
+
+        Returns a list of the missing names.'''
 
         if self.savedir is None:
             raise ValueError("savedir not set.")
 
+        missing = []
+
         subdir = os.path.join(self.savedir, self.generate_save_subdirname())
         for name, data_element in self.data.items():
-            data_element.load(subdir)
+            try:
+                with self.stage('load saved data'):
+                    fmt = data_element.load(subdir, mmap_mode=self.mmap_mode)
+            except FileNotFoundError:
+                missing.append(name)
+                continue
+
+            if fmt != self.save_format:
+                self.logger.info(
+                    f'Converting saved data for "{name}" to'
+                    f' "{self.save_format}" format.'
+                )
+                data_element.save(subdir, fmt=self.save_format)
+
+        return missing
 
     def check_names(self, location):
         for name in self.names:
@@ -488,6 +1127,309 @@ class DataCollector():
                 )
 
 
+class CollectionStats():
+    '''Thread-safe record of where time goes during data collection. See
+    DataCollector.enable_stats().
+
+    The collection is split into named stages (e.g., "read files", "trim").
+    For each stage, the following are accumulated:
+        time        wall time spent in the stage (s). Stages which run in
+                    several threads at once are summed over the threads, so
+                    this can be more than the total time.
+        calls       number of times the stage was run
+        files       number of files read
+        bytes       number of bytes read
+        samples     number of data samples read
+    '''
+
+    fields = ['time', 'calls', 'files', 'bytes', 'samples']
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name, **counts):
+        '''Context manager which adds the time spent inside it (and any
+        counts) to stage name.'''
+
+        t = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time=perf_counter() - t, calls=1, **counts)
+
+    def add(self, name, **counts):
+        '''Adds to the totals of stage name. Keyword arguments must be in
+        CollectionStats.fields, e.g. add('read files', files=1, bytes=100).'''
+
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = dict.fromkeys(self.fields, 0)
+
+            for key, val in counts.items():
+                stage[key] += val
+
+    def report(self):
+        '''Returns a dictionary {stage name: {field: total}}, in the order the
+        stages were first run.'''
+
+        with self.lock:
+            return deepcopy(self.stages)
+
+    def format_report(self):
+        '''Returns the report as a table (string).'''
+
+        report = self.report()
+
+        width = max([len(name) for name in report] + [5])
+
+        lines = [
+            f'{"Stage":<{width}}  {"time (s)":>10}  {"calls":>7}'
+            f'  {"files":>7}  {"bytes":>12}  {"samples":>12}'
+        ]
+        for name, stage in report.items():
+            lines.append(
+                f'{name:<{width}}  {stage["time"]:>10.4f}'
+                f'  {stage["calls"]:>7}  {stage["files"]:>7}'
+                f'  {stage["bytes"]:>12}  {stage["samples"]:>12}'
+            )
+
+        return '\n'.join(lines)
+
+
+class IntervalIndex():
+    '''Sorted list of (start, end, item) intervals, for finding the items
+    that overlap a given time span by bisection.
+
+    The intervals are sorted by start. The running maximum of the ends is
+    also stored, since (unlike the ends themselves) it is sorted, so that
+    both ends of a query can be found by bisection.
+    '''
+
+    def __init__(self, intervals):
+
+        self.intervals = sorted(intervals, key=lambda i: (i[0], i[1]))
+        self.starts = [start for start, end, item in self.intervals]
+
+        self.max_ends = []
+        for start, end, item in self.intervals:
+            if self.max_ends:
+                end = max(end, self.max_ends[-1])
+            self.max_ends.append(end)
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def find(self, start, end, inclusive=True):
+        '''Returns a list of (start, end, item) for all intervals that overlap
+        the span from start to end, sorted by start.
+
+        If inclusive is False, intervals which only touch the span at one
+        point are excluded.'''
+
+        if inclusive:
+            i0 = bisect.bisect_left(self.max_ends, start)
+            i1 = bisect.bisect_right(self.starts, end)
+        else:
+            i0 = bisect.bisect_right(self.max_ends, start)
+            i1 = bisect.bisect_left(self.starts, end)
+
+        return [
+            i for i in self.intervals[i0:i1]
+            if (i[1] >= start if inclusive else i[1] > start)
+        ]
+
+
+class PersistentIndex():
+    '''Base class for indexes of remote data files which are stored (as json)
+    in a local file, so that they persist between collectors (see, e.g.,
+    SVTFolderIndex).
+
+    Child classes keep the index in memory, and convert it to/from a
+    json-serializable object with get_contents()/set_contents(). They should
+    set self.modified whenever the index changes. Call save() to write any
+    changes to disk.
+
+    If index_path is None, the index is only kept in memory.
+    '''
+
+    description = 'index'
+
+    def __init__(self, index_path=None):
+        self.index_path = index_path
+        self.modified = False
+
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.load()
+
+    def get_contents(self):
+        '''Returns the index as a json-serializable object. Must be filled in
+        for child class.'''
+        raise NotImplementedError
+
+    def set_contents(self, contents):
+        '''Sets the index from contents (as returned by get_contents()), or
+        clears it if contents is None. Must be filled in for child class.
+
+        Should raise KeyError, TypeError or ValueError if contents is not
+        valid.'''
+        raise NotImplementedError
+
+    def load(self):
+
+        contents = None
+
+        if (self.index_path is not None) and os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r') as f:
+                    contents = json.load(f)
+                self.set_contents(contents)
+            except (ValueError, OSError, KeyError, TypeError):
+                self.logger.warning(
+                    f'Could not read {self.description} "{self.index_path}".'
+                    ' Starting a new one.'
+                )
+                contents = None
+
+        if contents is None:
+            self.set_contents(None)
+
+        self.modified = False
+
+    def save(self):
+
+        if (self.index_path is None) or not self.modified:
+            return
+
+        write_json(self.index_path, self.get_contents())
+
+        self.modified = False
+
+
+def write_json(path, contents):
+    '''Writes contents to path as json, replacing any existing file.
+
+    The json is written to a uniquely-named temporary file in the same folder
+    first, and then moved into place. So an interrupted save can't corrupt
+    the existing file, and concurrent saves (from other threads or processes)
+    can't write into the same temporary file. (The last save wins.)
+    '''
+
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+
+    tmp_file = tempfile.NamedTemporaryFile(
+        'w', dir=folder, prefix=os.path.basename(path) + '.', suffix='.tmp',
+        delete=False
+    )
+
+    try:
+        with tmp_file:
+            json.dump(contents, tmp_file)
+        os.replace(tmp_file.name, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_file.name)
+        raise
+
+
+def add_cancel_event(event):
+    '''Adds event (a threading.Event) to the cancellation events of the
+    current context. Setting it cancels any collection run in this context
+    (see DataCollector.check_cancelled()), as do the events of any enclosing
+    collection.'''
+
+    cancel_events.set(cancel_events.get() + (event,))
+
+
+def get_host(path):
+    '''Returns the (lowercase) host name of a network path such as
+    "\\\\insitu1\\Documents". Returns '' for local paths.
+
+    Fully qualified names are shortened to the first label, so that e.g.
+    "insitu1" and "insitu1.nexus.uwaterloo.ca" share one limit. (IP
+    addresses are kept whole.)'''
+
+    path = str(path)
+
+    if not (path.startswith('\\\\') or path.startswith('//')):
+        return ''
+
+    return short_host_name(re.split(r'[\\/]', path[2:])[0])
+
+
+def short_host_name(host):
+    '''Lowercase host name, without any domain. See get_host().'''
+
+    host = host.lower()
+
+    if re.fullmatch(r'[\d.]+', host):
+        return host
+
+    return host.split('.')[0]
+
+
+def set_host_limit(host, limit):
+    '''Sets the maximum number of concurrent asynchronous collections from
+    the given host (see get_host()). Applies to semaphores created
+    afterwards (i.e., to new event loops or hosts not yet used).'''
+
+    host_limits[short_host_name(host)] = limit
+
+
+def get_host_semaphore(host):
+    '''Returns the asyncio.Semaphore which limits concurrent collections from
+    host within the running event loop.'''
+
+    loop = asyncio.get_running_loop()
+
+    semaphores = host_semaphores.setdefault(loop, {})
+
+    if host not in semaphores:
+        semaphores[host] = asyncio.Semaphore(
+            host_limits.get(host, default_host_limit)
+        )
+
+    return semaphores[host]
+
+
+def join_chunks(chunks, tolerance=1e-6):
+    '''Prepares a list of consecutive DataElements (e.g., cache chunks) for
+    DataElement.add_data_chunks().
+
+    Neighbouring chunks may both include a data point on their shared
+    boundary. These duplicates (equal times, within tolerance seconds) are
+    removed, keeping the earlier chunk's point. Returns a new list.'''
+
+    joined = []
+    last = None
+
+    for chunk in chunks:
+        if (last is not None) and (len(chunk) != 0):
+            last_datetime0, last_t = last
+            shift = (last_datetime0 - chunk.datetime0).total_seconds()
+            chunk = chunk[chunk.time > last_t + shift + tolerance]
+
+        if len(chunk) != 0:
+            last = (chunk.datetime0, chunk.time[-1])
+
+        joined.append(chunk)
+
+    return joined
+
+
+def is_sorted(arr):
+    '''Returns True if the 1D array arr is in ascending order.'''
+    return bool(np.all(arr[1:] >= arr[:-1]))
+
+
 def parse_datetime(datetime_input):
     '''Converts datetime_input into a datetime.datetime object.
 
@@ -1,7 +1,215 @@
+# Standard library imports (not included in setup.py)
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 # Non-standard library imports (included in setup.py)
 import numpy as np
 
 
+def interface_matrix(N1, N2):
+    '''Transfer matrix for the interface from a material with refractive
+    index N2 into one with index N1. Works elementwise on arrays of N1, N2,
+    returning an array of shape (..., 2, 2).'''
+
+    N1, N2 = np.broadcast_arrays(
+        np.asarray(N1, dtype=complex), np.asarray(N2, dtype=complex)
+    )
+
+    M = np.empty(N1.shape + (2, 2), dtype=complex)
+
+    M[..., 0, 0] = M[..., 1, 1] = (N1 + N2)/(2*N1)
+    M[..., 0, 1] = M[..., 1, 0] = (N1 - N2)/(2*N1)
+
+    return M
+
+
+def propagate(T, exp_fact):
+    '''Multiplies transfer matrices T (shape (..., 2, 2)) by the layer
+    matrices diag(exp_fact, 1/exp_fact), using their diagonal structure.'''
+
+    return T*np.stack((exp_fact, 1/exp_fact), axis=-1)[..., None]
+
+
+def boundary_matrices(N, Ns, thickness, wl, T=None, start=0):
+    '''Calculates the transfer matrix at the bottom of each layer of a
+    structure (i.e., the product of all the interface and layer matrices
+    below it).
+
+    Inputs (any leading dimensions "..." are broadcast, e.g. for sweeps):
+        N           layer refractive indices, shape (..., num_wl, num_layers)
+        Ns          substrate refractive index, shape (..., num_wl)
+        thickness   layer thicknesses, shape (..., num_layers)
+        wl          wavelengths (in the same units as thickness), (num_wl,)
+
+    If T is given, with the matrices of the layers below start already filled
+    in (e.g., from a cache), only those of layer start and up are calculated
+    (in place).
+
+    Returns T, with shape (..., num_wl, num_layers, 2, 2)
+    '''
+
+    N, Ns, thickness = np.broadcast_arrays(
+        N, Ns[..., None], thickness[..., None, :]
+    )
+
+    if T is None:
+        T = np.empty(N.shape + (2, 2), dtype=complex)
+
+    for i in range(start, N.shape[-1]):
+        if i == 0:
+            T[..., i, :, :] = interface_matrix(N[..., i], Ns[..., i])
+        else:
+            exp_fact = np.exp(1j*2*np.pi*N[..., i-1]*thickness[..., i-1]/wl)
+            T[..., i, :, :] = np.matmul(
+                interface_matrix(N[..., i], N[..., i-1]),
+                propagate(T[..., i-1, :, :], exp_fact)
+            )
+
+    return T
+
+
+def layer_reflectance(N, Ns, thickness, growth_rate, wl, num_t, T=None):
+    '''Calculates the reflectance at num_t evenly-spaced times during the
+    growth of each layer of a structure.
+
+    Inputs are as for boundary_matrices(), plus growth_rate, with the same
+    shape as thickness. T are the boundary transfer matrices, if already
+    calculated.
+
+    Returns t, R, T, where
+        t   times, shape (..., num_layers, num_t)
+        R   reflectance, shape (..., num_wl, num_layers, num_t)
+        T   boundary transfer matrices (see boundary_matrices())
+    '''
+
+    if T is None:
+        T = boundary_matrices(N, Ns, thickness, wl)
+
+    t = layer_times(thickness, growth_rate, num_t)
+
+    return t, depth_reflectance(T, N, thickness, wl, num_t), T
+
+
+def layer_times(thickness, growth_rate, num_t):
+    '''Times of num_t evenly-spaced points during the growth of each layer
+    (see layer_reflectance()). Returns an array of shape
+    (..., num_layers, num_t).'''
+
+    growth_time = thickness/growth_rate
+
+    d = thickness[..., None]*np.linspace(0, 1, num_t)
+
+    t_start = np.cumsum(growth_time, axis=-1) - growth_time
+
+    return d/growth_rate[..., None] + t_start[..., None]
+
+
+def depth_reflectance(T, N, thickness, wl, num_t):
+    '''Reflectance at num_t evenly-spaced depths through each layer, given
+    the boundary transfer matrices T (see boundary_matrices()). This only
+    depends on the layer itself and T, so it can be calculated for any
+    subset of the layers.
+
+    Returns R, with shape (..., num_wl, num_layers, num_t)
+    '''
+
+    d = thickness[..., None]*np.linspace(0, 1, num_t)
+
+    phase = 2*np.pi*N[..., None]*d[..., None, :, :]/wl[:, None, None]
+
+    return reflectance_kernel(T, N, phase)
+
+
+def reflectance_at_times(
+    N, Ns, thickness, growth_rate, wl, times, T=None
+):
+    '''Calculates the reflectance at arbitrary times during the growth of a
+    structure (with t = 0 at the start of the first layer).
+
+    Inputs are as for layer_reflectance(), except that times is an array of
+    times of shape (num_times,). Each time is mapped to the layer being grown
+    (by searchsorted on the layer end times), and the reflectance is only
+    evaluated at those points. Times before the start give the reflectance of
+    the substrate, and times after the end give that of the full structure.
+
+    Returns R, with shape (..., num_wl, num_times)
+    '''
+
+    times = np.asarray(times, dtype=float)
+    num_layers = thickness.shape[-1]
+
+    if T is None:
+        T = boundary_matrices(N, Ns, thickness, wl)
+
+    growth_time = thickness/growth_rate
+    t_end = np.cumsum(growth_time, axis=-1)
+
+    # Index of the layer being grown at each time
+    if t_end.ndim == 1:
+        layer = np.searchsorted(t_end, times, side='right')
+    else:
+        layer = np.sum(times >= t_end[..., None], axis=-2)
+    layer = np.minimum(layer, num_layers - 1)
+
+    def take(arr):
+        return np.take_along_axis(
+            arr, np.broadcast_to(layer, arr.shape[:-1] + layer.shape[-1:]),
+            axis=-1
+        )
+
+    # Depth grown in the current layer
+    d = (times - take(t_end - growth_time))*take(growth_rate)
+    d = np.clip(d, 0, take(thickness))
+
+    N = np.take_along_axis(N, layer[..., None, :], axis=-1)
+    T = np.take_along_axis(T, layer[..., None, :, None, None], axis=-3)
+
+    phase = 2*np.pi*N*d[..., None, :]/wl[:, None]
+
+    return reflectance_kernel(T, N, phase[..., None])[..., 0]
+
+
+def reflectance_kernel(T, N, phase):
+    '''Reflectance at the surface of a layer with refractive index N, given
+    the transfer matrix T at the bottom of the layer and the phase
+    2*pi*N*d/wavelength across it.
+
+    Only the elements of the total matrix (vacuum interface x layer x T)
+    that are needed for the reflectance are calculated. With
+    T = [[a, b], [c, d]], layer matrix diag(e, 1/e), and vacuum interface
+    matrix [[p, q], [q, p]],
+        r = (q*e^2*a + p*c)/(p*e^2*a + q*c)
+
+    T and N have shapes (..., 2, 2) and (...). phase has shape (..., n),
+    and the result has shape (..., n).
+    '''
+
+    a = T[..., 0, 0, None]
+    c = T[..., 1, 0, None]
+
+    p = (1 + N[..., None])/2
+    q = (1 - N[..., None])/2
+
+    e2a = np.exp(2j*phase)*a
+
+    r = (q*e2a + p*c)/(p*e2a + q*c)
+
+    return r.real**2 + r.imag**2
+
+
+def wavelength_list(wavelengths):
+    '''A single wavelength or a sequence of wavelengths, as a list.
+
+    The values are kept as given (rather than e.g. converted by numpy to a
+    common type), since they are used as string keys of Material.N.
+    '''
+
+    if np.isscalar(wavelengths):
+        return [wavelengths]
+    else:
+        return list(wavelengths)
+
+
 class Material():
     def __init__(self, name):
         self.name = name
@@ -40,6 +248,10 @@ class Structure():
         self.num_t = num_t
         self.layers = []
 
+        # Boundary transfer matrices and layer reflectances from previous
+        # calculations, by wavelength (see update_layer_cache())
+        self.layer_cache = {}
+
         self.wavelength_scale = 1.0
         # Assumes wavelengths and structure are both in nm
         # To change structure to angstrom, use use_angstroms_for_structure()
@@ -60,6 +272,23 @@ class Structure():
                                      thickness,
                                      growth_rate))
 
+    def set_layer(self, i, material=None, thickness=None, growth_rate=None):
+        '''Changes the material, thickness and/or growth rate of layer i
+        (e.g., when fitting or designing a structure). Only the boundary
+        matrices from layer i up are recalculated afterwards.'''
+
+        layer = self.layers[i]
+
+        if material is not None:
+            layer.material = material
+            layer.N = material.N
+        if thickness is not None:
+            layer.thickness = thickness
+        if growth_rate is not None:
+            layer.growth_rate = growth_rate
+
+        layer.growth_time = layer.thickness/layer.growth_rate
+
     def calculate_transfer_matrices(self):
 
         for i in range(len(self.layers)):
@@ -136,6 +365,26 @@ class Structure():
 
         self.set_wavelength(wavelength)
 
+        if not self.layers:
+            return np.zeros(0), np.zeros(0)
+
+        t, R, N, T = self.calculate_layer_reflectance([wavelength])
+
+        for i, layer in enumerate(self.layers):
+            layer.t = t[i]
+            layer.set_transfer_matrix(T[0, i])
+            layer.set_vacuum_interface_matrix(interface_matrix(1.0, N[0, i]))
+            layer.set_reflectance(R[0, i])
+
+        return t.reshape(-1), R[0].reshape(-1)
+
+    def calculate_reflectance_reference(self, wavelength):
+        '''Reference implementation of calculate_reflectance(), which
+        multiplies the full 2x2 matrices at every time point. Much slower,
+        but kept for testing the faster methods against.'''
+
+        self.set_wavelength(wavelength)
+
         self.calculate_transfer_matrices()
 
         t_total = np.array([])
@@ -157,3 +406,419 @@ class Structure():
             R_total = np.concatenate((R_total, layer.reflectance))
 
         return t_total, R_total
+
+    def get_N(self, material, wavelengths):
+        return np.array(
+            [material.N[str(wl)] for wl in wavelengths], dtype=complex
+        )
+
+    def calculate_reflectance_map(self, wavelengths):
+        '''Calculates the reflectance for several wavelengths at once.
+
+        Same as calling calculate_reflectance() for each wavelength, but
+        all wavelengths, layers and times are computed in one broadcasted
+        pass (see reflectance_kernel()). Only the 2x2 transfer matrices at
+        the layer boundaries are chained in a loop (see
+        calculate_boundary_matrices()).
+
+        Returns t, R, where t is the same as from calculate_reflectance(),
+        and R has shape (len(wavelengths), len(t)).
+        '''
+
+        wavelengths = wavelength_list(wavelengths)
+        num_wl = len(wavelengths)
+
+        if not self.layers:
+            return np.zeros(0), np.zeros((num_wl, 0))
+
+        t, R, N, T = self.calculate_layer_reflectance(wavelengths)
+
+        return t.reshape(-1), R.reshape(num_wl, -1)
+
+    def calculate_layer_reflectance(self, wavelengths):
+        '''Calculates the reflectance at num_t points in each layer.
+
+        Returns t, R, N, T, where t has shape (num_layers, num_t), R has shape
+        (num_wl, num_layers, num_t), and N, T are from
+        calculate_boundary_matrices().
+        '''
+
+        wl, N, Ns, thickness, growth_rate = self.get_arrays(wavelengths)
+
+        T, R = self.update_layer_cache(
+            wl, N, Ns, thickness, reflectance=True
+        )
+
+        t = layer_times(thickness, growth_rate, self.num_t)
+
+        return t, R, N, T
+
+    def calculate_boundary_matrices(self, wavelengths):
+        '''Calculates the transfer matrix at the bottom of each layer (i.e.,
+        the product of all the interface and layer matrices below it).
+
+        Returns wl, N, T, where
+            wl  wavelengths (scaled to the structure units), shape (num_wl,)
+            N   layer refractive indices, shape (num_wl, num_layers)
+            T   transfer matrices, shape (num_wl, num_layers, 2, 2)
+        '''
+
+        wl, N, Ns, thickness, growth_rate = self.get_arrays(wavelengths)
+
+        return wl, N, self.get_boundary_matrices(wl, N, Ns, thickness)
+
+    def get_boundary_matrices(self, wl, N, Ns, thickness):
+        '''Returns the boundary transfer matrices (see boundary_matrices()),
+        reusing those cached from previous calls where possible. See
+        update_layer_cache().'''
+
+        T, R = self.update_layer_cache(wl, N, Ns, thickness)
+
+        return T
+
+    def update_layer_cache(self, wl, N, Ns, thickness, reflectance=False):
+        '''Calculates the boundary transfer matrices T (see
+        boundary_matrices()) and, if reflectance is True, the reflectance R
+        at num_t points in each layer (see depth_reflectance()), reusing the
+        results cached from previous calls where possible.
+
+        The matrix at the bottom of layer i only depends on the substrate,
+        the layers below it and N of layer i. The reflectance in layer i
+        also depends on its thickness. So, after appending or editing the
+        top layer (or any layer), only the layers from there up are
+        recalculated. Changes are found by comparing with the cached values,
+        so layers can also be modified directly.
+
+        Returns T, R (R is None if reflectance is False)
+        '''
+
+        num_wl, num_layers = N.shape
+
+        cached = [
+            self.get_num_cached(key, N[n], Ns[n], thickness)
+            for n, key in enumerate(wl)
+        ]
+        start_T = min([num_T for num_T, num_R in cached] + [num_layers])
+        start_R = min([num_R for num_T, num_R in cached] + [num_layers])
+
+        T = np.empty(N.shape + (2, 2), dtype=complex)
+        if start_T > 0:
+            for n, key in enumerate(wl):
+                T[n, :start_T] = self.layer_cache[key]['T'][:start_T]
+
+        boundary_matrices(N, Ns, thickness, wl, T, start_T)
+
+        if reflectance:
+            R = np.empty((num_wl, num_layers, self.num_t))
+            if start_R > 0:
+                for n, key in enumerate(wl):
+                    R[n, :start_R] = self.layer_cache[key]['R'][:start_R]
+
+            R[:, start_R:] = depth_reflectance(
+                T[:, start_R:], N[:, start_R:], thickness[start_R:], wl,
+                self.num_t
+            )
+        else:
+            R = None
+
+        for n, key in enumerate(wl):
+            if reflectance:
+                R_n = R[n]
+            elif key in self.layer_cache:
+                # Keep any reflectances that are still valid
+                R_n = self.layer_cache[key]['R'][:cached[n][1]]
+            else:
+                R_n = np.empty((0, self.num_t))
+
+            self.layer_cache[key] = {
+                'Ns': Ns[n],
+                'N': N[n].copy(),
+                'thickness': thickness.copy(),
+                'T': T[n].copy(),
+                'R': R_n.copy()
+            }
+
+        return T, R
+
+    def get_num_cached(self, key, N, Ns, thickness):
+        '''Returns the number of layers with valid boundary matrices and
+        valid reflectances in the cache for wavelength key, given the current
+        N, Ns and thickness (for that wavelength).'''
+
+        cache = self.layer_cache.get(key)
+        if cache is None or cache['Ns'] != Ns:
+            return 0, 0
+
+        num = min(len(N), len(cache['N']))
+
+        changed_N = N[:num] != cache['N'][:num]
+        changed_thickness = thickness[:num] != cache['thickness'][:num]
+
+        changed_T = changed_N.copy()
+        changed_T[1:] |= changed_thickness[:-1]
+
+        changed_R = (changed_N | changed_thickness)[:len(cache['R'])]
+        if cache['R'].shape[-1] != self.num_t:
+            changed_R[:] = True
+
+        return (
+            int(np.argmax(changed_T)) if np.any(changed_T) else num,
+            int(np.argmax(changed_R)) if np.any(changed_R) else len(changed_R)
+        )
+
+    def calculate_reflectance_at_times(self, times, wavelengths):
+        '''Calculates the reflectance at arbitrary times (e.g., the times
+        of measured data), rather than num_t points per layer. See
+        reflectance_at_times().
+
+        Returns R, with shape (len(wavelengths), len(times)).
+        '''
+
+        wavelengths = wavelength_list(wavelengths)
+        times = np.asarray(times, dtype=float)
+
+        if not self.layers:
+            Ns = self.get_N(self.substrate_material, wavelengths)
+            R = np.abs((1 - Ns)/(1 + Ns))**2
+            return np.repeat(R[:, None], len(times), axis=1)
+
+        wl, N, Ns, thickness, growth_rate = self.get_arrays(wavelengths)
+
+        T = self.get_boundary_matrices(wl, N, Ns, thickness)
+
+        return reflectance_at_times(
+            N, Ns, thickness, growth_rate, wl, times, T
+        )
+
+    def sweep(self, parameters, wavelengths, **kwargs):
+        '''Calculates the reflectance for every combination of parameters.
+        See sweep().'''
+        return sweep(self, parameters, wavelengths, **kwargs)
+
+    def get_arrays(self, wavelengths):
+        '''Returns the structure as arrays wl, N, Ns, thickness, growth_rate
+        (see layer_reflectance()).'''
+
+        wl = np.array([float(w) for w in wavelengths])/self.wavelength_scale
+
+        N = np.array(
+            [self.get_N(layer.material, wavelengths) for layer in self.layers]
+        ).reshape(len(self.layers), len(wavelengths)).T
+        Ns = self.get_N(self.substrate_material, wavelengths)
+
+        thickness = np.array([layer.thickness for layer in self.layers])
+        growth_rate = np.array([layer.growth_rate for layer in self.layers])
+
+        return wl, N, Ns, thickness, growth_rate
+
+
+class SweepResult():
+    '''Results of a parameter sweep (see sweep()).
+
+    Attributes:
+        parameters  dict {key: array of values}, one entry per grid axis
+        wavelengths list of wavelengths
+        shape       shape of the parameter grid
+        t           times, shape (*shape, num_times), where num_times is
+                    num_layers*num_t (or len(times), if given to sweep())
+        R           reflectance, shape (*shape, num_wl, num_times)
+    '''
+
+    def __init__(self, parameters, wavelengths, t, R):
+        self.parameters = parameters
+        self.wavelengths = wavelengths
+        self.shape = t.shape[:-1]
+        self.t = t
+        self.R = R
+
+    def get_index(self, point):
+        '''Returns the grid index for point, a dict {key: value}. Parameters
+        missing from point are not selected (i.e., they give a full slice).'''
+
+        index = []
+        for key, values in self.parameters.items():
+            if key not in point:
+                index.append(slice(None))
+                continue
+
+            matches = [
+                n for n, value in enumerate(values) if value == point[key]
+            ]
+            if not matches:
+                raise ValueError(f'{point[key]} not in sweep values for {key}')
+
+            index.append(matches[0])
+
+        return tuple(index)
+
+    def sel(self, point):
+        '''Returns t, R at point, a dict {key: value} (see get_index()).'''
+
+        index = self.get_index(point)
+
+        return self.t[index], self.R[index]
+
+
+def sweep(
+    structure, parameters, wavelengths, max_workers=1, chunk_size=None,
+    times=None
+):
+    '''Calculates the reflectance of structure for every combination of
+    parameter values.
+
+    parameters is a dict {key: list of values}. Each key is a tuple
+    (target, attribute), where target is either a layer index or a material
+    name (which selects every layer of that material) and attribute is
+    "thickness", "growth_rate" or "N". Values of N can be numbers (used for
+    every wavelength) or dicts {wavelength: N}. E.g.,
+        {
+            (-1, 'thickness'): np.linspace(50, 100, 11),
+            ('GaAs', 'growth_rate'): [0.17, 0.18, 0.19],
+            ('AlAs', 'N'): [{950.3: 3.04, 469.5: 3.73 - 0.1j}, ...]
+        }
+    If several keys set the same layer, the later ones take precedence. If
+    parameters is empty, the structure is calculated as is (a single point,
+    with shape ()).
+
+    Points are calculated in chunks of chunk_size, with each chunk
+    vectorized over its points, wavelengths, layers and times. (By default,
+    chunks are sized to keep the arrays for each at about 64 MB.) If
+    max_workers > 1, the chunks are spread over that many processes (None
+    means one per CPU).
+
+    If times is given, the reflectance is calculated at those times (see
+    reflectance_at_times()) instead of num_t points per layer.
+
+    Returns a SweepResult. Note the full reflectance is stored for each
+    point, which takes num_wl*num_times*8 bytes per point.
+    '''
+
+    wavelengths = wavelength_list(wavelengths)
+
+    wl, N, Ns, thickness, growth_rate = structure.get_arrays(wavelengths)
+    num_t = structure.num_t
+
+    if times is None:
+        num_times = N.shape[-1]*num_t
+    else:
+        times = np.asarray(times, dtype=float)
+        num_times = len(times)
+
+    updates = [
+        get_sweep_update(structure, key, values, wavelengths)
+        for key, values in parameters.items()
+    ]
+
+    shape = tuple(len(values) for values in parameters.values())
+    num_points = int(np.prod(shape))
+
+    if chunk_size is None:
+        chunk_size = max(1, 2**22//(len(wavelengths)*num_times))
+
+        # Make sure there are enough chunks to go around the workers
+        if max_workers != 1:
+            num_workers = max_workers or os.cpu_count()
+            chunk_size = max(
+                1, min(chunk_size, -(-num_points//(4*num_workers)))
+            )
+
+    def generate_chunks():
+        for start in range(0, num_points, chunk_size):
+            points = np.arange(start, min(start + chunk_size, num_points))
+
+            # (With no parameters, the grid is the single point "as is".)
+            inds = np.unravel_index(points, shape) if shape else ()
+
+            arrays = {
+                'N': np.repeat(N[None], len(points), axis=0),
+                'thickness': np.repeat(thickness[None], len(points), axis=0),
+                'growth_rate': np.repeat(
+                    growth_rate[None], len(points), axis=0
+                )
+            }
+
+            for (attribute, layers, values), ind in zip(updates, inds):
+                arrays[attribute][..., layers] = values[ind][..., None]
+
+            yield (
+                arrays['N'], Ns, arrays['thickness'], arrays['growth_rate'],
+                wl, num_t, times
+            )
+
+    if max_workers == 1:
+        chunks = [sweep_chunk(*args) for args in generate_chunks()]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(sweep_chunk, *args)
+                for args in generate_chunks()
+            ]
+            chunks = [future.result() for future in futures]
+
+    if chunks:
+        t = np.concatenate([t for t, R in chunks])
+        R = np.concatenate([R for t, R in chunks])
+    else:
+        t = np.zeros((0, num_times))
+        R = np.zeros((0, len(wavelengths), num_times))
+
+    return SweepResult(
+        parameters={
+            key: np.asarray(values) for key, values in parameters.items()
+        },
+        wavelengths=wavelengths,
+        t=t.reshape(shape + t.shape[1:]),
+        R=R.reshape(shape + R.shape[1:])
+    )
+
+
+def get_sweep_update(structure, key, values, wavelengths):
+    '''Converts a sweep parameter (see sweep()) into (attribute, layers,
+    values), where layers is a list of the layer indices to set, and values
+    is an array of shape (num_values,) (or (num_values, num_wl) for N).'''
+
+    target, attribute = key
+
+    if isinstance(target, str):
+        layers = [
+            i for i, layer in enumerate(structure.layers)
+            if layer.material.name == target
+        ]
+        if not layers:
+            raise ValueError(f'No layers of material "{target}"')
+    else:
+        layers = [range(len(structure.layers))[target]]
+
+    if attribute in ['thickness', 'growth_rate']:
+        values = np.asarray(values, dtype=float)
+    elif attribute == 'N':
+        rows = []
+        for value in values:
+            if isinstance(value, dict):
+                value = {str(wl): N for wl, N in value.items()}
+                rows.append([value[str(wl)] for wl in wavelengths])
+            else:
+                rows.append([value]*len(wavelengths))
+        values = np.array(rows, dtype=complex).reshape(
+            len(rows), len(wavelengths)
+        )
+    else:
+        raise ValueError(f'Invalid sweep attribute "{attribute}"')
+
+    return attribute, layers, values
+
+
+def sweep_chunk(N, Ns, thickness, growth_rate, wl, num_t, times=None):
+    '''Calculates one chunk of points for sweep(). Returns t, R with shapes
+    (num_points, num_times) and (num_points, num_wl, num_times).'''
+
+    if times is not None:
+        R = reflectance_at_times(N, Ns, thickness, growth_rate, wl, times)
+        return np.repeat(times[None], R.shape[0], axis=0), R
+
+    t, R, T = layer_reflectance(N, Ns, thickness, growth_rate, wl, num_t)
+
+    return (
+        t.reshape(t.shape[0], -1),
+        R.reshape(R.shape[0], R.shape[1], -1)
+    )
@@ -0,0 +1,206 @@
+'''Writes synthetic Molly, SVT and BET/ISP data in the same formats (and
+folder layout) as the lab computers, for testing and benchmarking.
+
+Run as a script to generate the "test_data" folder used by
+GrowthDataCollector.set_test_mode():
+
+    python synthetic_data.py [start date] [number of days]
+
+The default covers 2019-12-22 to 2019-12-25, as used in the examples.
+'''
+
+import datetime
+import os
+import sys
+
+import numpy as np
+
+from qncmbe.data_import.data_names import index
+
+
+def write_molly_hour(data_path, hour, signals):
+    '''Writes a synthetic Molly header + binary pair for a single hour.
+
+    signals is a dictionary {local_name: (time, vals)}, with time in seconds
+    relative to midnight.
+    '''
+
+    folder = os.path.join(
+        data_path, hour.strftime("%Y"), hour.strftime("%m-%b")
+    )
+    os.makedirs(folder, exist_ok=True)
+
+    header_lines = []
+    blocks = [np.zeros(2, dtype='<f4')]
+    offset = 0
+
+    for local_name, (time, vals) in signals.items():
+        block = np.zeros(2*len(time), dtype='<f4')
+        block[0::2] = np.asarray(time)/86400
+        block[1::2] = vals
+        blocks.append(block)
+
+        header_lines.append(
+            f"DataItem=Name:{local_name};Type:Float;"
+            f"TotalValues:{len(time)};ValueOffset:{offset}\n"
+        )
+        offset += len(time)
+
+    with open(os.path.join(folder, hour.strftime("%dday-%Hhr.txt")), 'w') as f:
+        f.writelines(header_lines)
+
+    binary_path = os.path.join(folder, hour.strftime("%dday-%Hhr-binary.txt"))
+    with open(binary_path, 'wb') as f:
+        f.write(np.concatenate(blocks).tobytes())
+
+    return binary_path
+
+
+def write_SVT_folder(data_path, name, t_zero, time, vals, write_info=True):
+    '''Writes a synthetic SVT data folder.
+
+    time is given in seconds relative to t_zero. vals is written to every
+    data column of every file (offset by the column number).
+    '''
+
+    folder = os.path.join(data_path, name)
+    os.makedirs(folder, exist_ok=True)
+
+    time = np.asarray(time, dtype=float)
+    vals = np.asarray(vals, dtype=float)
+
+    arr = np.column_stack([time/86400] + [vals + c for c in range(4)])
+
+    for postfix in ['Engine 1.txt', 'IS4K Temp.txt', 'IS4K Refl.txt']:
+        with open(os.path.join(folder, f'{name}_{postfix}'), 'w') as f:
+            f.write('Time\tA\tB\tC\tD\n')
+            np.savetxt(f, arr, fmt=['%.10f'] + ['%.6f']*4, delimiter='\t')
+
+    if write_info:
+        fmt = "%Y-%m-%d %H:%M:%S.%f"
+        ts = t_zero + datetime.timedelta(seconds=time[0])
+        te = t_zero + datetime.timedelta(seconds=time[-1])
+        with open(os.path.join(folder, 'time_info.txt'), 'w') as f:
+            f.write(f'Zero_time = {t_zero.strftime(fmt)}\n')
+            f.write(f'Data_start_time = {ts.strftime(fmt)}\n')
+            f.write(f'Data_end_time = {te.strftime(fmt)}')
+
+    return folder
+
+
+def write_BET_file(folder, prefix, ctime, time, vals):
+    '''Writes a synthetic BET/ISP data file, named by its creation time.
+
+    time is given in seconds relative to ctime. vals is written to every
+    data column (offset by the column number). The modification time is set
+    to the time of the last data point.
+    '''
+
+    os.makedirs(folder, exist_ok=True)
+
+    fname = f"{prefix} {ctime:%H.%M.%S} {ctime:%A, %B %d, %Y}.dat"
+    fpath = os.path.join(folder, fname)
+
+    time = np.asarray(time, dtype=float)
+    arr = np.column_stack(
+        [time] + [np.asarray(vals, dtype=float) + c for c in range(3)]
+    )
+
+    with open(fpath, 'w') as f:
+        f.write('Time\tTemp\tIntegral\tTemp\n')
+        np.savetxt(f, arr, delimiter='\t')
+
+    mtime = (ctime + datetime.timedelta(seconds=time[-1])).timestamp()
+    os.utime(fpath, (mtime, mtime))
+
+    return fpath
+
+
+def random_walk(rng, num, start=500.0, step=0.5):
+    return start + np.cumsum(rng.normal(0, step, num))
+
+
+def generate_test_data(
+    basedir, start, days=1, molly_names=None, molly_dt=10.0, svt_dt=1.0,
+    bet_dt=1.0, growth_hours=(8, 16), seed=0
+):
+    '''Writes a full synthetic data tree in basedir, in the layout expected by
+    GrowthDataCollector.set_test_mode():
+        basedir/Molly Data      Molly hour files for every hour
+        basedir/SVT Data        one SVT folder per day
+        basedir/BET Data        one BET file per day
+        basedir/ISP Data        one ISP file per day
+
+    Inputs:
+        start       first day (a datetime; the time of day is ignored)
+        days        number of days to generate
+        molly_names names of the Molly signals to write (default: all)
+        molly_dt    mean spacing (s) of the Molly samples. Molly only logs
+                    when a value changes, so the times are random
+        svt_dt      spacing (s) of the SVT samples
+        bet_dt      spacing (s) of the BET/ISP samples
+        growth_hours
+                    (start, end) hours of the daily "growth", during which
+                    the SVT and BET/ISP software are recording
+        seed        random seed
+    '''
+
+    rng = np.random.default_rng(seed)
+
+    if molly_names is None:
+        molly_names = index.get_names_list('Molly')
+
+    local_names = [index[n].parameters['local_name'] for n in molly_names]
+
+    day0 = datetime.datetime(start.year, start.month, start.day)
+
+    molly_path = os.path.join(basedir, 'Molly Data')
+    for h in range(24*days):
+        hour = day0 + datetime.timedelta(hours=h)
+        t0 = hour.hour*3600.0
+
+        signals = {}
+        for local_name in local_names:
+            num = max(rng.poisson(3600/molly_dt), 1)
+            time = np.sort(rng.uniform(t0, t0 + 3600, num))
+            # Molly repeats the previous value at the start of each hour
+            time[0] = t0
+            signals[local_name] = (time, random_walk(rng, num))
+
+        write_molly_hour(molly_path, hour, signals)
+
+    g_start, g_end = [h*3600.0 for h in growth_hours]
+
+    for n in range(days):
+        day = day0 + datetime.timedelta(days=n)
+        growth_start = day + datetime.timedelta(seconds=g_start)
+
+        time = np.arange(g_start, g_end, svt_dt)
+        write_SVT_folder(
+            os.path.join(basedir, 'SVT Data'), f'G{n:04d}', day, time,
+            random_walk(rng, len(time), start=0.3, step=0.001)
+        )
+
+        time = np.arange(0, g_end - g_start, bet_dt)
+        for prefix in ['BET', 'ISP']:
+            write_BET_file(
+                os.path.join(basedir, f'{prefix} Data'), prefix,
+                growth_start, time, random_walk(rng, len(time))
+            )
+
+
+if __name__ == '__main__':
+
+    start = datetime.datetime(2019, 12, 22)
+    days = 4
+
+    if len(sys.argv) > 1:
+        start = datetime.datetime.fromisoformat(sys.argv[1])
+    if len(sys.argv) > 2:
+        days = int(sys.argv[2])
+
+    basedir = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'test_data'
+    )
+
+    generate_test_data(basedir, start, days)
@@ -0,0 +1,100 @@
+import datetime
+import os
+
+import numpy as np
+import pytest
+
+from synthetic_data import write_BET_file
+
+from qncmbe.data_import.BET import BETDataCollector, read_BET_data_file
+
+
+def test_file_index(tmp_path):
+
+    folder = tmp_path / 'BET Data'
+    names = ['BET temp']
+
+    t0 = datetime.datetime(2020, 1, 1)
+    hour = datetime.timedelta(hours=1)
+
+    for n in range(6):
+        write_BET_file(
+            folder, 'BET', t0 + 2*n*hour, [0.0, 1800.0, 3600.0], [n, n, n]
+        )
+    (folder / 'notes.txt').write_text('Not a data file')
+
+    index_path = str(tmp_path / 'file_index.json')
+
+    def make_collector(start, end):
+        collector = BETDataCollector(
+            start, end, names, file_index_path=index_path
+        )
+        collector.main_data_path = str(tmp_path)
+
+        parsed = []
+        get_file_info = collector.get_file_info
+        collector.get_file_info = lambda fpath, stat=None: parsed.append(
+            os.path.basename(fpath)
+        ) or get_file_info(fpath, stat)
+
+        return collector, parsed
+
+    start = t0 + 3*hour
+    end = t0 + 7*hour
+
+    collector, parsed = make_collector(start, end)
+    data = collector.collect_data()
+    assert len(parsed) == 7
+
+    expected = [
+        fpath for fpath in sorted(map(str, folder.iterdir()))
+        if collector.is_data_file(fpath) is True
+    ]
+    found = collector.file_index.find(str(folder), start, end)
+    assert [fpath for fpath, ctime in found] == expected
+    assert [ctime for fpath, ctime in found] == [t0 + 4*hour, t0 + 6*hour]
+
+    np.testing.assert_array_equal(data['BET temp'].vals, [2]*3 + [3]*3)
+    np.testing.assert_allclose(
+        data['BET temp'].time, [3600, 5400, 7200, 10800, 12600, 14400]
+    )
+
+    # Files are only parsed again if they change, also with a new collector
+    parsed.clear()
+    collector.collect_data()
+    assert parsed == []
+
+    collector, parsed = make_collector(start, end)
+    write_BET_file(
+        folder, 'BET', t0 + 12*hour, [0.0, 7200.0], [7, 7]
+    )
+    collector.collect_data()
+    assert len(parsed) == 1
+
+
+@pytest.mark.parametrize('chunk_rows', [7, 10000])
+def test_read_BET_data_file(tmp_path, chunk_rows):
+
+    time = np.arange(0.0, 3600.0, 10.0)
+    fpath = write_BET_file(
+        tmp_path, 'ISP', datetime.datetime(2020, 1, 1), time, time/100
+    )
+
+    full = np.loadtxt(fpath, skiprows=1)
+
+    arr, size = read_BET_data_file(
+        fpath, [0, 2], chunk_rows=chunk_rows, return_size=True
+    )
+    np.testing.assert_array_equal(arr, full[:, [0, 2]])
+    assert size == os.path.getsize(fpath)
+
+    arr = read_BET_data_file(
+        fpath, [0, 3, 1], t_min=600.0, t_max=900.0, chunk_rows=chunk_rows
+    )
+
+    inds = (arr[:, 0] >= 600.0) & (arr[:, 0] <= 900.0)
+    expected = (full[:, 0] >= 600.0) & (full[:, 0] <= 900.0)
+
+    np.testing.assert_array_equal(arr[inds], full[expected][:, [0, 3, 1]])
+    if chunk_rows == 7:
+        assert len(arr) < 50
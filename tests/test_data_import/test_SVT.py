@@ -0,0 +1,202 @@
+import datetime
+import os
+
+import numpy as np
+import pytest
+
+from synthetic_data import write_SVT_folder
+
+from qncmbe.data_import import SVT
+from qncmbe.data_import.SVT import (
+    SVTDataCollector, read_SVT_data_file, read_SVT_data_file_reference
+)
+
+
+def test_folder_index(tmp_path, monkeypatch):
+
+    data_path = tmp_path / 'SVT Data'
+    index_path = str(tmp_path / 'folder_index.json')
+    names = ['Refl calib 950', 'Emiss temp']
+
+    day = datetime.timedelta(days=1)
+    t_zero = datetime.datetime(2020, 1, 1)
+
+    for n in range(3):
+        write_SVT_folder(
+            data_path, f'G{n:04d}', t_zero + n*day,
+            [36000.0, 39600.0, 43200.0], [n, n + 0.5, n + 0.75]
+        )
+    (data_path / 'notes.txt').write_text('Not an SVT folder')
+    os.makedirs(data_path / 'G0003')
+
+    def collect(start, end, folder_index_path):
+        collector = SVTDataCollector(
+            start, end, names, folder_index_path=folder_index_path
+        )
+        collector.main_data_path = str(data_path)
+        return collector.get_data()
+
+    opened = []
+    get_time_info = SVT.get_SVT_folder_time_info
+    monkeypatch.setattr(
+        SVT, 'get_SVT_folder_time_info',
+        lambda folder: opened.append(os.path.basename(folder))
+        or get_time_info(folder)
+    )
+
+    start = t_zero + datetime.timedelta(days=1, hours=9)
+    end = start + datetime.timedelta(hours=3)
+
+    reference = collect(start, end, None)
+    assert len(reference['Refl calib 950']) == 3
+
+    opened.clear()
+    data = collect(start, end, index_path)
+    assert sorted(opened) == ['G0000', 'G0001', 'G0002']
+
+    for name in names:
+        np.testing.assert_array_equal(data[name].time, reference[name].time)
+        np.testing.assert_array_equal(data[name].vals, reference[name].vals)
+
+    # Nothing changed, so no folders are re-checked
+    opened.clear()
+    collect(start, end, index_path)
+    assert opened == []
+
+    # New folders and folders that have since become SVT folders are picked
+    # up without touching the others
+    write_SVT_folder(
+        data_path, 'G0003', t_zero + 3*day, [36000.0, 39600.0], [3, 3.5]
+    )
+    write_SVT_folder(
+        data_path, 'G0004', t_zero + 4*day, [36000.0, 39600.0], [4, 4.5]
+    )
+
+    start = t_zero + datetime.timedelta(days=3, hours=9)
+    end = start + datetime.timedelta(days=2)
+
+    opened.clear()
+    data = collect(start, end, index_path)
+    assert sorted(opened) == ['G0003', 'G0004']
+
+    np.testing.assert_array_equal(
+        data['Refl calib 950'].vals, [3.0, 3.5, 4.0, 4.5]
+    )
+
+
+@pytest.mark.parametrize('garbage', [False, True])
+def test_read_SVT_data_file_parity(tmp_path, garbage):
+
+    rng = np.random.default_rng(0)
+
+    lines = ['Time\tA\tB\tC\n', 'Units\tdays\ta.u.\n']
+    for row in rng.uniform(0, 1, (200, 4)):
+        lines.append('\t'.join(f'{v:.8f}' for v in row) + '\n')
+
+    if garbage:
+        lines.insert(50, 'Paused\n')
+        lines.insert(100, '0.5\t0.25\n')
+        lines.append('0.99\t0.1')
+
+    (tmp_path / 'G0001_IS4K Refl.txt').write_text(''.join(lines[:120]))
+    (tmp_path / 'G0001_IS4K Refm.txt').write_text(''.join(lines[120:]))
+
+    for cols in [[0], [0, 2], [3, 0, 1]]:
+        fpath = str(tmp_path / 'G0001_IS4K Refl.txt')
+
+        fast = read_SVT_data_file(fpath, cols)
+        ref = read_SVT_data_file_reference(fpath, cols)
+
+        assert fast.shape == ref.shape
+        assert fast.shape[0] >= 200
+        np.testing.assert_array_equal(fast, ref)
+
+
+def test_stats_count_incremented_files(tmp_path):
+
+    t_zero = datetime.datetime(2020, 1, 1)
+    folder = write_SVT_folder(
+        tmp_path, 'G0001', t_zero, [36000.0, 39600.0], [1.0, 1.5]
+    )
+
+    # Continue the data in an incremented file
+    refm = os.path.join(folder, 'G0001_IS4K Refm.txt')
+    with open(refm, 'w') as f:
+        f.write(f'{43200.0/86400:.10f}\t2.0\t3.0\t4.0\t5.0\n')
+
+    collector = SVTDataCollector(
+        t_zero, t_zero + datetime.timedelta(days=1), ['Refl calib 950']
+    )
+    collector.main_data_path = str(tmp_path)
+    collector.enable_stats()
+    data = collector.collect_data()
+
+    assert len(data['Refl calib 950']) == 3
+
+    read = collector.get_stats()['SVTDataCollector: read files']
+    assert read['files'] == 2
+    assert read['samples'] == 3
+    assert read['bytes'] == (
+        os.path.getsize(os.path.join(folder, 'G0001_IS4K Refl.txt'))
+        + os.path.getsize(refm)
+    )
+
+
+def test_read_each_file_once(tmp_path, monkeypatch):
+
+    names = ['Refl calib 950', 'Refl calib 470', 'Emiss temp']
+
+    t_zero = datetime.datetime(2020, 1, 1)
+    write_SVT_folder(
+        tmp_path, 'G0001', t_zero, [36000.0, 39600.0], [1.0, 1.5]
+    )
+
+    reads = []
+    read = SVT.read_SVT_data_file
+    monkeypatch.setattr(
+        SVT, 'read_SVT_data_file',
+        lambda filepath, cols, **kwargs: reads.append(
+            (os.path.basename(filepath), cols)
+        ) or read(filepath, cols, **kwargs)
+    )
+
+    collector = SVTDataCollector(
+        t_zero, t_zero + datetime.timedelta(days=1), names
+    )
+    collector.main_data_path = str(tmp_path)
+    data = collector.collect_data()
+
+    assert sorted(reads) == [
+        ('G0001_IS4K Refl.txt', [0, 1, 2]), ('G0001_IS4K Temp.txt', [0, 3])
+    ]
+
+    np.testing.assert_array_equal(data['Refl calib 950'].vals, [1.0, 1.5])
+    np.testing.assert_array_equal(data['Refl calib 470'].vals, [2.0, 2.5])
+    np.testing.assert_array_equal(data['Emiss temp'].vals, [3.0, 3.5])
+    np.testing.assert_allclose(data['Emiss temp'].time, [36000.0, 39600.0])
+
+
+def test_bad_lines_parsed_alone(tmp_path, monkeypatch):
+
+    rng = np.random.default_rng(0)
+
+    lines = ['Time\tA\tB\n']
+    for row in rng.uniform(0, 1, (5000, 3)):
+        lines.append('\t'.join(f'{v:.8f}' for v in row) + '\n')
+    lines.insert(2500, 'Paused\n')
+    lines.append('0.99\t0.1')
+
+    fpath = tmp_path / 'G0001_IS4K Refl.txt'
+    fpath.write_text(''.join(lines))
+
+    parsed = []
+    parse_SVT_line = SVT.parse_SVT_line
+    monkeypatch.setattr(
+        SVT, 'parse_SVT_line',
+        lambda line, cols: parsed.append(line) or parse_SVT_line(line, cols)
+    )
+
+    arr = read_SVT_data_file(str(fpath), [0, 2], try_increments=False)
+
+    assert arr.shape == (5000, 2)
+    assert len(parsed) < 50
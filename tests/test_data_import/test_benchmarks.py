@@ -0,0 +1,131 @@
+'''Benchmarks for the data_import pipeline, run on synthetic data (see
+synthetic_data.py). Requires the pytest-benchmark plugin.
+
+The amount of synthetic data can be set with environment variables:
+    QNCMBE_BENCHMARK_DAYS       number of days of data (default 1)
+    QNCMBE_BENCHMARK_MOLLY_DT   mean spacing of the Molly samples in seconds
+                                (default 10)
+
+E.g., to time a week-long pull, and compare against a saved run:
+    QNCMBE_BENCHMARK_DAYS=7 pytest test_benchmarks.py --benchmark-compare
+'''
+
+import datetime
+import os
+
+import numpy as np
+import pytest
+
+from synthetic_data import generate_test_data
+
+from qncmbe.data_import.core import get_growth_data
+from qncmbe.data_import.data_names import index
+from qncmbe.data_import.BET import BETDataCollector, read_BET_data_file
+from qncmbe.data_import.molly import MollyDataCollector, read_binary_values
+from qncmbe.data_import.SVT import SVTDataCollector, read_SVT_data_file
+
+pytest.importorskip('pytest_benchmark')
+
+days = int(os.environ.get('QNCMBE_BENCHMARK_DAYS', 1))
+molly_dt = float(os.environ.get('QNCMBE_BENCHMARK_MOLLY_DT', 10))
+
+start = datetime.datetime(2020, 1, 1)
+end = start + datetime.timedelta(days=days)
+
+molly_names = index.get_names_list('Molly')[:20]
+names = {
+    'Molly': molly_names,
+    'SVT': index.get_names_list('SVT'),
+    'BET': index.get_names_list('BET')
+}
+
+
+@pytest.fixture(scope='module')
+def data_path(tmp_path_factory):
+
+    basedir = tmp_path_factory.mktemp('benchmark_data')
+    generate_test_data(
+        basedir, start, days, molly_names=molly_names, molly_dt=molly_dt
+    )
+
+    data_dirs = {
+        MollyDataCollector: basedir / 'Molly Data',
+        SVTDataCollector: basedir / 'SVT Data',
+        BETDataCollector: basedir
+    }
+
+    with pytest.MonkeyPatch.context() as mp:
+        for cls, path in data_dirs.items():
+            mp.setattr(cls, 'default_data_path', str(path))
+        yield basedir
+
+
+def test_get_growth_data(benchmark, data_path):
+
+    all_names = sum(names.values(), [])
+
+    data = benchmark(get_growth_data, start, end, all_names)
+
+    assert all(len(data[name]) > 0 for name in all_names)
+
+
+@pytest.mark.parametrize('molly_dt', [None, 60])
+def test_get_growth_data_saved(benchmark, data_path, tmp_path, molly_dt):
+
+    all_names = sum(names.values(), [])
+
+    get_growth_data(start, end, all_names, str(tmp_path), molly_dt)
+
+    benchmark(get_growth_data, start, end, all_names, str(tmp_path), molly_dt)
+
+
+@pytest.mark.parametrize(
+    'cls,location',
+    [
+        (MollyDataCollector, 'Molly'),
+        (SVTDataCollector, 'SVT'),
+        (BETDataCollector, 'BET')
+    ]
+)
+def test_collect_data(benchmark, data_path, cls, location):
+
+    def collect_data():
+        return cls(start, end, names[location]).collect_data()
+
+    data = benchmark(collect_data)
+
+    assert all(len(data[name]) > 0 for name in names[location])
+
+
+def test_read_molly_binary(benchmark, data_path):
+
+    binary_path = (
+        data_path / 'Molly Data' / start.strftime("%Y") /
+        start.strftime("%m-%b") / start.strftime("%dday-%Hhr-binary.txt")
+    )
+
+    # Read the whole file as a single signal
+    num = os.path.getsize(binary_path)//8 - 1
+
+    def read():
+        with open(binary_path, 'rb') as binary:
+            return read_binary_values(binary, num, 0)
+
+    time, vals = benchmark(read)
+    assert len(time) == num
+
+
+def test_read_SVT_data_file(benchmark, data_path):
+
+    fpath = next((data_path / 'SVT Data' / 'G0000').glob('*IS4K Refl.txt'))
+
+    arr = benchmark(read_SVT_data_file, str(fpath), [0, 1, 2])
+    assert arr.shape[1] == 3
+
+
+def test_read_BET_data_file(benchmark, data_path):
+
+    fpath = next((data_path / 'BET Data').glob('*.dat'))
+
+    arr = benchmark(read_BET_data_file, str(fpath), [0, 1])
+    assert np.all(np.diff(arr[:, 0]) > 0)
@@ -0,0 +1,329 @@
+import asyncio
+import datetime
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from synthetic_data import write_molly_hour
+
+from qncmbe.data_import import utils
+from qncmbe.data_import.growths import GrowthDataCollector
+from qncmbe.data_import.data_names import index
+from qncmbe.data_import.utils import DataCollector, DataElement
+
+
+def test_concurrent_collectors():
+
+    start = datetime.datetime(2020, 1, 1)
+    end = datetime.datetime(2020, 1, 1, 1)
+
+    names = ['Ga1 tip measured', 'BET temp', 'Refl calib 950']
+
+    collector = GrowthDataCollector(start, end, names)
+
+    release = threading.Event()
+
+    def molly_data():
+        name = 'Ga1 tip measured'
+        return {
+            name: DataElement(name, start, '°C', [0.0, 1.0], [500.0, 501.0])
+        }
+
+    def slow_BET_data():
+        release.wait(5)
+        return {
+            'BET temp': DataElement('BET temp', start, '°C', [0.0], [1.0])
+        }
+
+    def broken_SVT_data():
+        raise OSError('Cannot reach SVT computer')
+
+    collector.collectors['Molly'].collect_data = molly_data
+    collector.collectors['BET'].collect_data = slow_BET_data
+    collector.collectors['SVT'].collect_data = broken_SVT_data
+
+    collector.set_timeout('BET', 0.1)
+
+    try:
+        data = collector.collect_data()
+    finally:
+        release.set()
+
+    assert set(data.keys()) == set(names)
+
+    np.testing.assert_array_equal(data['Ga1 tip measured'].vals, [500, 501])
+    assert len(data['BET temp']) == 0
+    assert len(data['Refl calib 950']) == 0
+    assert data['BET temp'].units == '°C'
+
+
+def test_failed_location_not_saved(tmp_path):
+
+    start = datetime.datetime(2020, 1, 1)
+    end = datetime.datetime(2020, 1, 1, 1)
+    names = ['Ga1 tip measured', 'BET temp']
+    savedir = str(tmp_path / 'saves')
+
+    def make_collector(BET_data):
+        collector = GrowthDataCollector(start, end, names, savedir)
+
+        name = 'Ga1 tip measured'
+        collector.collectors['Molly'].collect_data = lambda: {
+            name: DataElement(name, start, '°C', [0.0, 1.0], [500.0, 501.0])
+        }
+        collector.collectors['BET'].collect_data = BET_data
+
+        return collector
+
+    BET = {'BET temp': DataElement('BET temp', start, '°C', [0.0], [1.0])}
+
+    stopped = threading.Event()
+
+    def slow_BET_data():
+        # Runs until cancelled by the timeout
+        try:
+            for n in range(500):
+                old_BET.check_cancelled()
+                time.sleep(0.01)
+        finally:
+            stopped.set()
+        return BET
+
+    collector = make_collector(slow_BET_data)
+    old_BET = collector.collectors['BET']
+    collector.set_timeout('BET', 0.1)
+
+    data = collector.get_data()
+    assert len(data['BET temp']) == 0
+    assert collector.failed_locations == ['BET']
+
+    # The timed out collection is stopped, and not used again
+    assert stopped.wait(1)
+    assert collector.collectors['BET'] is not old_BET
+    assert collector.collectors['BET'].names == ['BET temp']
+
+    # Only the Molly data was saved, so BET is collected again
+    collector = make_collector(lambda: BET)
+    data = collector.get_data()
+
+    assert collector.failed_locations == []
+    np.testing.assert_array_equal(data['BET temp'].vals, [1.0])
+    np.testing.assert_array_equal(data['Ga1 tip measured'].vals, [500, 501])
+
+
+def test_get_data_async(tmp_path):
+
+    names = ['Ga1 tip measured']
+    local_name = index[names[0]].parameters['local_name']
+
+    for h in range(4, 8):
+        t0 = h*3600
+        write_molly_hour(
+            tmp_path, datetime.datetime(2020, 1, 1, h),
+            {local_name: (np.array([t0, t0 + 900.0]), np.array([h - 1, h]))}
+        )
+
+    def make_collector():
+        collector = GrowthDataCollector(
+            '2020-01-01 05:10', '2020-01-01 06:50', names
+        )
+        collector.set_data_path('Molly', str(tmp_path))
+        return collector
+
+    async def get_all():
+        return await asyncio.gather(
+            make_collector().get_data_async(),
+            make_collector().get_data_async()
+        )
+
+    expected = make_collector().get_data()
+
+    for data in asyncio.run(get_all()):
+        np.testing.assert_array_equal(
+            data[names[0]].time, expected[names[0]].time
+        )
+        np.testing.assert_array_equal(
+            data[names[0]].vals, expected[names[0]].vals
+        )
+
+
+def test_get_data_async_savedir(tmp_path, monkeypatch):
+
+    start = datetime.datetime(2020, 1, 1)
+    end = datetime.datetime(2020, 1, 1, 1)
+    names = ['Ga1 tip measured', 'BET temp']
+    savedir = tmp_path / 'saves'
+
+    hosts = []
+    get_host_semaphore = utils.get_host_semaphore
+    monkeypatch.setattr(
+        utils, 'get_host_semaphore',
+        lambda host: hosts.append(host) or get_host_semaphore(host)
+    )
+
+    def make_collector():
+        collector = GrowthDataCollector(start, end, names, str(savedir))
+
+        name = 'Ga1 tip measured'
+        collector.collectors['Molly'].collect_data = lambda: {
+            name: DataElement(name, start, '°C', [0.0, 1.0], [500.0, 501.0])
+        }
+
+        return collector
+
+    # Cancelling stops the collection, and nothing is saved
+    stopped = threading.Event()
+    reads = []
+
+    def slow_BET_data():
+        try:
+            for n in range(500):
+                BET.check_cancelled()
+                reads.append(n)
+                time.sleep(0.01)
+        finally:
+            stopped.set()
+
+    collector = make_collector()
+    BET = collector.collectors['BET']
+    BET.collect_data = slow_BET_data
+
+    async def cancel_collection():
+        task = asyncio.create_task(collector.get_data_async())
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_collection())
+
+    assert stopped.wait(1)
+    assert len(reads) < 500
+    saved = [fname for _, _, fnames in os.walk(savedir) for fname in fnames]
+    assert not any(fname.startswith('BET temp') for fname in saved)
+
+    # Each location is collected within the limit for its host (Molly and
+    # BET are the same machine), and saved data is loaded without waiting on
+    # the host
+    assert hosts == ['insitu1', 'insitu1']
+
+    hosts.clear()
+    collector = make_collector()
+    collector.collectors['BET'].collect_data = lambda: {
+        'BET temp': DataElement('BET temp', start, '°C', [0.0], [1.0])
+    }
+    data = asyncio.run(collector.get_data_async())
+
+    assert hosts == ['insitu1']
+    np.testing.assert_array_equal(data['BET temp'].vals, [1.0])
+    np.testing.assert_array_equal(data['Ga1 tip measured'].vals, [500, 501])
+
+
+class SlowCollector(DataCollector):
+    '''Reads a "file" every 10 ms until cancelled.'''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reads = 0
+        self.stopped = threading.Event()
+
+    def collect_data(self):
+        try:
+            for n in range(100):
+                self.check_cancelled()
+                self.reads += 1
+                time.sleep(0.01)
+        finally:
+            self.stopped.set()
+        return self.data
+
+
+def test_cancel_async():
+
+    collector = SlowCollector(
+        '2020-01-01 00:00', '2020-01-01 01:00', ['Ga1 tip measured']
+    )
+
+    async def cancel_collection():
+        task = asyncio.create_task(collector.collect_data_async())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_collection())
+
+    assert collector.stopped.wait(1)
+    assert 0 < collector.reads < 100
+
+    # Synchronous collections are unaffected
+    collector.reads = 0
+    collector.collect_data()
+    assert collector.reads == 100
+
+
+def test_collection_stats(tmp_path, caplog):
+
+    names = ['Ga1 tip measured']
+    local_name = index[names[0]].parameters['local_name']
+
+    for h in range(4, 8):
+        t0 = h*3600
+        write_molly_hour(
+            tmp_path, datetime.datetime(2020, 1, 1, h),
+            {local_name: (np.array([t0, t0 + 900.0]), np.array([h - 1, h]))}
+        )
+
+    collector = GrowthDataCollector(
+        '2020-01-01 05:10', '2020-01-01 06:50', names
+    )
+    collector.set_data_path('Molly', str(tmp_path))
+
+    assert collector.get_stats() is None
+
+    collector.enable_stats()
+
+    with caplog.at_level('INFO'):
+        collector.get_data()
+
+    stats = collector.get_stats()
+
+    assert stats['GrowthDataCollector: get_data']['calls'] == 1
+
+    read = stats['MollyDataCollector: read binary']
+    assert read['files'] == 4
+    assert read['samples'] == 8
+    assert read['bytes'] == 64
+    assert stats['MollyDataCollector: parse headers']['files'] == 4
+    assert stats['MollyDataCollector: trim']['time'] > 0
+
+    assert 'MollyDataCollector: read binary' in caplog.text
+
+
+def test_collector_options(tmp_path):
+
+    options = {
+        'Molly': {'max_workers': 3, 'header_index_dir': str(tmp_path)},
+        'SVT': {'folder_index_path': str(tmp_path / 'SVT.json')}
+    }
+
+    collector = GrowthDataCollector(
+        '2020-01-01 05:10', '2020-01-01 06:50', ['Ga1 tip measured'],
+        molly_dt=10, collector_options=options
+    )
+
+    molly = collector.collectors['Molly']
+    assert molly.max_workers == 3
+    assert molly.dt == 10
+    assert molly.header_index.index_dir == str(tmp_path)
+    assert collector.collectors['SVT'].folder_index is not None
+    assert collector.collectors['BET'].file_index.index_path is None
+
+    with pytest.raises(ValueError):
+        GrowthDataCollector(
+            '2020-01-01 05:10', '2020-01-01 06:50', ['Ga1 tip measured'],
+            collector_options={'SVTs': {}}
+        )
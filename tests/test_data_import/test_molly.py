@@ -0,0 +1,333 @@
+import datetime
+import os
+
+import numpy as np
+import pytest
+
+from synthetic_data import write_molly_hour
+
+from qncmbe.data_import import molly
+from qncmbe.data_import.molly import (
+    MollyDataCollector, read_binary_values, read_binary_values_reference
+)
+from qncmbe.data_import.data_names import index
+
+
+def test_binary_decoder_parity(tmp_path):
+
+    rng = np.random.default_rng(0)
+
+    hour = datetime.datetime(2020, 1, 1, 5)
+    signals = {}
+    for n in range(5):
+        num = rng.integers(0, 200)
+        signals[f'Instances.Test{n}.Measured'] = (
+            np.sort(rng.uniform(5*3600, 6*3600, num)),
+            rng.normal(500, 100, num)
+        )
+
+    binary_path = write_molly_hour(tmp_path, hour, signals)
+
+    offset = 0
+    with open(binary_path, 'rb') as binary:
+        for time, vals in signals.values():
+            num = len(time)
+            t_fast, v_fast = read_binary_values(binary, num, offset)
+            t_ref, v_ref = read_binary_values_reference(binary, num, offset)
+
+            np.testing.assert_array_equal(t_fast, t_ref)
+            np.testing.assert_array_equal(v_fast, v_ref)
+            assert len(t_fast) == num
+
+            offset += num
+
+
+@pytest.mark.parametrize(
+    'use_mmap,max_workers', [(False, 1), (True, 1), (False, 4)]
+)
+def test_collect_data(tmp_path, use_mmap, max_workers):
+
+    names = ['Ga1 tip measured', 'Al1 base setpoint']
+
+    start = datetime.datetime(2020, 1, 1, 5, 10)
+    end = datetime.datetime(2020, 1, 1, 6, 50)
+
+    for h in range(3, 9):
+        hour = datetime.datetime(2020, 1, 1, h)
+        t0 = h*3600
+        # Molly repeats the previous value at the start of each hour
+        signals = {
+            index[name].parameters['local_name']: (
+                np.array([t0, t0 + 900.0, t0 + 2400.0]),
+                np.array([h - 0.5, h, h + 0.5])
+            )
+            for name in names
+        }
+        write_molly_hour(tmp_path, hour, signals)
+
+    collector = MollyDataCollector(
+        start, end, names, use_mmap=use_mmap, max_workers=max_workers
+    )
+    collector.main_data_path = str(tmp_path)
+
+    data = collector.collect_data()
+
+    for name in names:
+        element = data[name]
+        assert element.datetime0 == start
+        assert element.time[0] == pytest.approx(0.0)
+        assert element.time[-1] == pytest.approx(100*60)
+        assert np.all(np.diff(element.time) >= 0)
+        assert element.vals[0] == pytest.approx(4.5)
+        assert element.vals[1] == pytest.approx(5.0)
+        assert element.vals[-1] == pytest.approx(6.5)
+
+
+def test_header_index(tmp_path, monkeypatch):
+
+    names = ['Ga1 tip measured', 'Al1 base setpoint']
+    local_names = [index[name].parameters['local_name'] for name in names]
+
+    hours = [datetime.datetime(2020, 1, d, 5) for d in [1, 2]]
+    for hour in hours:
+        t0 = hour.hour*3600.0
+        write_molly_hour(
+            tmp_path, hour,
+            {ln: (np.array([t0, t0 + 60.0]), np.array([1.0, 2.0]))
+             for ln in local_names}
+        )
+
+    index_dir = tmp_path / 'header_index'
+
+    collector = MollyDataCollector(
+        hours[0], hours[0] + datetime.timedelta(minutes=30), names,
+        header_index_dir=str(index_dir)
+    )
+    collector.main_data_path = str(tmp_path)
+
+    expected = collector.get_line_numbers(hours[0])
+    assert expected == ({names[0]: 2, names[1]: 2}, {names[0]: 0, names[1]: 2})
+
+    collector.header_index.save()
+    day_path = index_dir / '2020' / '2020-01-01.json'
+    assert os.listdir(index_dir / '2020') == ['2020-01-01.json']
+
+    # A fresh index should be loaded from disk without re-parsing the header
+    parsed = []
+    parse_header_file = molly.parse_header_file
+    monkeypatch.setattr(
+        molly, 'parse_header_file',
+        lambda path: parsed.append(path) or parse_header_file(path)
+    )
+
+    collector.set_header_index_dir(str(index_dir))
+    assert collector.get_line_numbers(hours[0]) == expected
+    assert parsed == []
+
+    # A new day is stored in its own file, without rewriting the others
+    mtime = os.stat(day_path).st_mtime_ns
+    assert collector.get_line_numbers(hours[1]) == expected
+    collector.header_index.save()
+
+    assert len(parsed) == 1
+    assert sorted(os.listdir(index_dir / '2020')) == [
+        '2020-01-01.json', '2020-01-02.json'
+    ]
+    assert os.stat(day_path).st_mtime_ns == mtime
+
+
+def test_parse_header_duplicates(tmp_path, caplog):
+
+    name = 'Ga1 tip measured'
+    local_name = index[name].parameters['local_name']
+
+    header_path = tmp_path / 'header.txt'
+    header_path.write_text(
+        f"DataItem=Name:{local_name};Type:Float;TotalValues:3;ValueOffset:0\n"
+        "DataItem=Name:Other;Type:Float;TotalValues:2;ValueOffset:3\n"
+        f"DataItem=Name:{local_name};Type:Float;TotalValues:4;ValueOffset:5\n"
+        "Some other line\n"
+    )
+
+    items, duplicates = molly.parse_header_file(header_path)
+    assert items == {local_name: [4, 5], 'Other': [2, 3]}
+    assert duplicates == [local_name]
+
+    hour = datetime.datetime(2020, 1, 1, 5)
+    collector = MollyDataCollector(
+        hour, hour + datetime.timedelta(hours=1), [name, 'Al1 base setpoint']
+    )
+    collector.get_header_path = lambda hour: header_path
+
+    total_values, values_offset = collector.get_line_numbers(hour)
+    assert total_values == {name: 4, 'Al1 base setpoint': 0}
+    assert values_offset == {name: 5, 'Al1 base setpoint': 0}
+    assert 'Duplicate entries' in caplog.text
+
+
+@pytest.mark.parametrize('dt', [None, 60])
+def test_chunked_cache(tmp_path, dt):
+
+    names = ['Ga1 tip measured', 'Al1 base setpoint']
+    data_path = tmp_path / 'Molly data'
+    savedir = str(tmp_path / 'saves')
+
+    for h in range(3, 12):
+        hour = datetime.datetime(2020, 1, 1, h)
+        t0 = h*3600
+        signals = {
+            index[name].parameters['local_name']: (
+                np.array([t0, t0 + 900.0, t0 + 2400.0, t0 + 3599.0]),
+                np.array([h - 0.75, h, h + 0.5, h + 0.75])
+            )
+            for name in names
+        }
+        write_molly_hour(data_path, hour, signals)
+
+    def make_collector(start, end, savedir):
+        collector = MollyDataCollector(start, end, names, savedir, dt=dt)
+        collector.main_data_path = str(data_path)
+        if savedir is not None:
+            collector.set_savedir(
+                savedir, cache_chunk=datetime.timedelta(hours=1)
+            )
+
+        collected = []
+        collect_chunk = collector.collect_chunk
+
+        def counting_collect_chunk():
+            collected.append(collector.start_time)
+            return collect_chunk()
+
+        collector.collect_chunk = counting_collect_chunk
+
+        return collector, collected
+
+    requests = [
+        (datetime.datetime(2020, 1, 1, 5, 10),
+         datetime.datetime(2020, 1, 1, 6, 50)),
+        (datetime.datetime(2020, 1, 1, 5, 30),
+         datetime.datetime(2020, 1, 1, 8, 20)),
+    ]
+
+    expected_collected = [
+        [datetime.datetime(2020, 1, 1, h) for h in [5, 6]],
+        [datetime.datetime(2020, 1, 1, h) for h in [7, 8]]
+    ]
+
+    for (start, end), expected in zip(requests, expected_collected):
+
+        collector, collected = make_collector(start, end, savedir)
+        data = collector.get_data()
+        assert collected == expected
+
+        reference, _ = make_collector(start, end, None)
+        reference = reference.get_data()
+
+        for name in names:
+            assert data[name].datetime0 == start
+            np.testing.assert_allclose(data[name].time, reference[name].time)
+            np.testing.assert_array_equal(
+                data[name].vals, reference[name].vals
+            )
+
+
+def test_partial_cache(tmp_path):
+
+    names = ['Ga1 tip measured', 'Al1 base setpoint']
+    data_path = tmp_path / 'Molly data'
+    savedir = str(tmp_path / 'saves')
+
+    for h in range(4, 8):
+        t0 = h*3600
+        write_molly_hour(
+            data_path, datetime.datetime(2020, 1, 1, h),
+            {
+                index[name].parameters['local_name']: (
+                    np.array([t0, t0 + 900.0]), np.array([h - 0.5, h])
+                )
+                for name in names
+            }
+        )
+
+    start = datetime.datetime(2020, 1, 1, 5, 10)
+    end = datetime.datetime(2020, 1, 1, 6, 50)
+
+    collected = []
+
+    def get_data(names):
+        collector = MollyDataCollector(start, end, names, savedir)
+        collector.main_data_path = str(data_path)
+
+        collect_data = collector.collect_data
+
+        def recording_collect_data():
+            collected.append(list(collector.names))
+            return collect_data()
+
+        collector.collect_data = recording_collect_data
+
+        return collector.get_data()
+
+    first = get_data(names[:1])
+    both = get_data(names)
+
+    assert collected == [names[:1], names[1:]]
+    assert list(both.keys()) == names
+
+    for name in names:
+        assert both[name].datetime0 == start
+        assert both[name].vals[-1] == pytest.approx(6.0)
+    np.testing.assert_array_equal(both[names[0]].time, first[names[0]].time)
+
+    get_data(names[::-1])
+    assert len(collected) == 2
+
+
+@pytest.mark.parametrize('dt', [None, 60])
+def test_iter_chunks(tmp_path, dt):
+
+    names = ['Ga1 tip measured']
+    local_name = index[names[0]].parameters['local_name']
+
+    for h in range(3, 12):
+        t0 = h*3600
+        write_molly_hour(
+            tmp_path, datetime.datetime(2020, 1, 1, h),
+            {local_name: (
+                np.array([t0, t0 + 900.0, t0 + 2400.0]),
+                np.array([h - 0.5, h, h + 0.5])
+            )}
+        )
+
+    start = datetime.datetime(2020, 1, 1, 5, 10)
+    end = datetime.datetime(2020, 1, 1, 9, 50)
+
+    collector = MollyDataCollector(start, end, names, dt=dt)
+    collector.main_data_path = str(tmp_path)
+
+    expected = collector.get_data()[names[0]]
+
+    windows = list(collector.iter_chunks(datetime.timedelta(hours=1)))
+
+    assert len(windows) == 5
+    assert collector.start_time == start
+    assert (
+        windows[1][names[0]].datetime0 == start + datetime.timedelta(hours=1)
+    )
+
+    joined = collector.initialize_data()[names[0]]
+    joined.add_data_chunks([window[names[0]] for window in windows])
+
+    if dt is None:
+        # Apart from the step values at the window starts, the data matches
+        inds = np.searchsorted(joined.time, expected.time)
+        np.testing.assert_allclose(joined.time[inds], expected.time)
+        np.testing.assert_array_equal(joined.vals[inds], expected.vals)
+        np.testing.assert_array_equal(
+            joined.step_interpolate(joined.time).vals,
+            expected.step_interpolate(joined.time).vals
+        )
+    else:
+        np.testing.assert_allclose(joined.time, expected.time, atol=1e-9)
+        np.testing.assert_array_equal(joined.vals, expected.vals)
@@ -0,0 +1,263 @@
+import datetime
+import json
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from qncmbe.data_import.utils import (
+    DataCollector, DataElement, PersistentIndex, get_host
+)
+
+
+def make_element(datetime0, time, vals):
+    return DataElement(
+        'Ga1 tip measured', datetime0, '°C', np.array(time), np.array(vals)
+    )
+
+
+@pytest.mark.parametrize('shuffle', [False, True])
+def test_add_data_chunks(shuffle):
+
+    t0 = datetime.datetime(2020, 1, 1)
+    hour = datetime.timedelta(hours=1)
+
+    chunks = [
+        make_element(t0 + n*hour, [0.0, 600.0, 1200.0], [n, n + 0.1, n + 0.2])
+        for n in range(6)
+    ]
+
+    if shuffle:
+        chunks = chunks[::-1]
+
+    expected = make_element(t0, [], [])
+    for chunk in chunks:
+        expected.add_data(chunk)
+
+    element = make_element(t0, [], [])
+    element.add_data_chunks(chunks)
+
+    np.testing.assert_allclose(element.time, expected.time)
+    np.testing.assert_array_equal(element.vals, expected.vals)
+    assert np.all(np.diff(element.time) >= 0)
+
+
+def test_add_data_chunks_incompatible():
+
+    t0 = datetime.datetime(2020, 1, 1)
+    element = make_element(t0, [0.0], [1.0])
+    other = DataElement('Ga1 tip setpoint', t0, '°C', [1.0], [2.0])
+
+    with pytest.raises(ValueError):
+        element.add_data_chunks([other])
+
+
+def test_set_data_sorts():
+
+    t0 = datetime.datetime(2020, 1, 1)
+    element = make_element(t0, [3.0, 1.0, 2.0], [30, 10, 20])
+
+    np.testing.assert_array_equal(element.time, [1.0, 2.0, 3.0])
+    np.testing.assert_array_equal(element.vals, [10, 20, 30])
+
+
+def test_set_data_no_copy():
+
+    t0 = datetime.datetime(2020, 1, 1)
+    time = np.array([1.0, 2.0, 3.0])
+    vals = np.array([10.0, 20.0, 30.0])
+
+    element = make_element(t0, [], [])
+    element.set_data(time, vals)
+
+    assert element.time is time
+    assert element.vals is vals
+
+
+def test_add_data_merge():
+
+    t0 = datetime.datetime(2020, 1, 1)
+    element = make_element(t0, [0.0, 2.0, 4.0], [0, 2, 4])
+    other = make_element(
+        t0 + datetime.timedelta(seconds=1),
+        [0.0, 1.0, 3.0, 5.0], [10, 20, 40, 60]
+    )
+
+    element.add_data(other)
+
+    np.testing.assert_array_equal(element.time, [0, 1, 2, 2, 4, 4, 6])
+    # On ties, existing data comes first
+    np.testing.assert_array_equal(element.vals, [0, 10, 2, 20, 4, 40, 60])
+    assert element.datetime0 == t0
+
+
+def test_add_data_merge_dtypes():
+
+    t0 = datetime.datetime(2020, 1, 1)
+    element = make_element(t0, [0, 2, 4], [0, 2, 4])
+    other = make_element(t0, [1.5], [10.7])
+
+    element.add_data(other)
+
+    np.testing.assert_array_equal(element.time, [0, 1.5, 2, 4])
+    np.testing.assert_array_equal(element.vals, [0, 10.7, 2, 4])
+
+    element = make_element(t0, [0, 10, 20], [0, 1, 2])
+    element.trim(
+        t0 + datetime.timedelta(seconds=5.5),
+        t0 + datetime.timedelta(seconds=15.5),
+        include_endpoints=True
+    )
+
+    np.testing.assert_array_equal(element.time, [5.5, 10, 15.5])
+
+
+def test_trim_endpoints():
+
+    t0 = datetime.datetime(2020, 1, 1)
+    element = make_element(t0, [0.0, 10.0, 20.0, 30.0], [0, 1, 2, 3])
+
+    element.trim(
+        t0 + datetime.timedelta(seconds=5),
+        t0 + datetime.timedelta(seconds=25),
+        include_endpoints=True
+    )
+
+    np.testing.assert_array_equal(element.time, [5.0, 10.0, 20.0, 25.0])
+    np.testing.assert_array_equal(element.vals, [0, 1, 2, 2])
+
+
+@pytest.mark.parametrize('fmt', ['npy', 'dat'])
+def test_save_load(tmp_path, fmt):
+
+    t0 = datetime.datetime(2020, 1, 1, 3, 4, 5, 678)
+    element = make_element(t0, [0.0, 1.5, 3.25], [20.0, 21.0, 22.5])
+
+    element.save(tmp_path, fmt=fmt)
+
+    loaded = make_element(datetime.datetime(2000, 1, 1), [], [])
+    loaded.units = ''
+    assert loaded.load(tmp_path) == fmt
+
+    assert loaded.datetime0 == t0
+    assert loaded.units == '°C'
+    np.testing.assert_array_equal(loaded.time, element.time)
+    np.testing.assert_array_equal(loaded.vals, element.vals)
+
+
+def test_load_mmap(tmp_path):
+
+    t0 = datetime.datetime(2020, 1, 1)
+    make_element(t0, [0.0, 1.0], [2.0, 3.0]).save(tmp_path)
+
+    loaded = make_element(t0, [], [])
+    loaded.load(tmp_path, mmap_mode='r')
+
+    assert isinstance(loaded.time, np.memmap)
+
+    loaded.set_datetime0(t0 - datetime.timedelta(seconds=10))
+    np.testing.assert_array_equal(loaded.time, [10.0, 11.0])
+
+
+def test_collector_converts_text_saves(tmp_path):
+
+    start = datetime.datetime(2020, 1, 1)
+    end = datetime.datetime(2020, 1, 2)
+    names = ['Ga1 tip measured']
+
+    collector = DataCollector(start, end, names, savedir=str(tmp_path))
+    collector.data[names[0]].set_data([0.0, 1.0], [5.0, 6.0])
+    collector.save_format = 'dat'
+    collector.save_data()
+
+    subdir = tmp_path / collector.generate_save_subdirname()
+    assert (subdir / f'{names[0]}.dat').exists()
+    assert not (subdir / f'{names[0]}.json').exists()
+
+    collector = DataCollector(start, end, names, savedir=str(tmp_path))
+    data = collector.get_data()
+
+    np.testing.assert_array_equal(data[names[0]].vals, [5.0, 6.0])
+    assert (subdir / f'{names[0]}.json').exists()
+
+
+def test_collector_switches_save_format(tmp_path):
+
+    start = datetime.datetime(2020, 1, 1)
+    end = datetime.datetime(2020, 1, 2)
+    names = ['Ga1 tip measured']
+
+    collector = DataCollector(start, end, names, savedir=str(tmp_path))
+    collector.data[names[0]].set_data([0.0, 1.0], [1.0, 1.0])
+    collector.save_data()
+
+    # Fresh data saved in the other format replaces the old save
+    collector.set_savedir(str(tmp_path), save_format='dat')
+    collector.data[names[0]].set_data([0.0, 1.0], [2.0, 2.0])
+    collector.save_data()
+
+    subdir = tmp_path / collector.generate_save_subdirname()
+    assert not (subdir / f'{names[0]}.json').exists()
+    assert not (subdir / f'{names[0]}.npy').exists()
+
+    collector = DataCollector(start, end, names, savedir=str(tmp_path))
+    collector.set_savedir(str(tmp_path), save_format='dat')
+    data = collector.get_data()
+
+    np.testing.assert_array_equal(data[names[0]].vals, [2.0, 2.0])
+    assert not (subdir / f'{names[0]}.npy').exists()
+
+
+class DictIndex(PersistentIndex):
+
+    def get_contents(self):
+        return self.entries
+
+    def set_contents(self, contents):
+        self.entries = {} if contents is None else dict(contents)
+
+
+def test_persistent_index(tmp_path, caplog):
+
+    index_path = str(tmp_path / 'index' / 'index.json')
+
+    # Concurrent saves each write their own temporary file
+    def save(n):
+        index = DictIndex(index_path)
+        for m in range(20):
+            index.entries = {str(n): list(range(1000*m))}
+            index.modified = True
+            index.save()
+
+    threads = [threading.Thread(target=save, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # The last save wins
+    entries = DictIndex(index_path).entries
+    assert len(entries) == 1
+    assert len(list(entries.values())[0]) == 19000
+    assert os.listdir(tmp_path / 'index') == ['index.json']
+
+    with open(index_path, 'w') as f:
+        f.write('{"truncated": [1, 2')
+
+    assert DictIndex(index_path).entries == {}
+    assert 'Could not read index' in caplog.text
+
+    with open(index_path, 'w') as f:
+        json.dump({'a': 1}, f)
+
+    assert DictIndex(index_path).entries == {'a': 1}
+    assert DictIndex(None).entries == {}
+
+
+def test_get_host():
+
+    assert get_host('\\\\insitu1\\Documents') == 'insitu1'
+    assert get_host('//INSITU1.nexus.uwaterloo.ca/BET') == 'insitu1'
+    assert get_host('\\\\192.168.0.12\\data') == '192.168.0.12'
+    assert get_host('C:\\data') == ''
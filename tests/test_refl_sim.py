@@ -0,0 +1,270 @@
+import numpy as np
+import pytest
+
+from qncmbe import refl_sim
+from qncmbe.refl_sim import Material, Structure
+
+
+wavelengths = [950.3, 469.5]
+
+
+def make_bragg_mirror(num_repeats=3, num_t=200):
+
+    GaAs = Material('GaAs')
+    AlAs = Material('AlAs')
+
+    GaAs.set_N_at_wavelength(950.3, 3.7575 - 0.1070j)
+    AlAs.set_N_at_wavelength(950.3, 3.047 - 0.00j)
+
+    GaAs.set_N_at_wavelength(469.5, 4.667 - 1.594j)
+    AlAs.set_N_at_wavelength(469.5, 3.7341 - 0.1022j)
+
+    struct = Structure(substrate_material=GaAs, num_t=num_t)
+    for i in range(num_repeats):
+        struct.add_layer(AlAs, thickness=80.0 + i, growth_rate=0.1)
+        struct.add_layer(GaAs, thickness=65.0 - i, growth_rate=0.18)
+
+    return struct
+
+
+def test_reflectance_map():
+
+    struct = make_bragg_mirror()
+
+    t_map, R_map = struct.calculate_reflectance_map(wavelengths)
+
+    assert R_map.shape == (2, len(t_map))
+
+    for n, wl in enumerate(wavelengths):
+        t, R = struct.calculate_reflectance_reference(wl)
+
+        np.testing.assert_allclose(t_map, t)
+        np.testing.assert_allclose(R_map[n], R, rtol=1e-10)
+
+    assert np.all((R_map >= 0) & (R_map <= 1))
+
+    # Bare substrate reflectance at t = 0
+    N = 3.7575 - 0.1070j
+    assert R_map[0, 0] == pytest.approx(abs((1 - N)/(1 + N))**2)
+
+
+def add_int_wavelength(struct):
+    '''Also set N at 470 (an int), for checking mixed wavelength lists'''
+    for material in [struct.substrate_material, struct.layers[0].material]:
+        material.set_N_at_wavelength(470, material.N['469.5'])
+
+
+def test_reflectance_map_mixed_wavelengths():
+
+    struct = make_bragg_mirror()
+    add_int_wavelength(struct)
+
+    t_map, R_map = struct.calculate_reflectance_map([950.3, 470])
+
+    for n, wl in enumerate([950.3, 470]):
+        t, R = struct.calculate_reflectance(wl)
+
+        np.testing.assert_allclose(R_map[n], R, rtol=1e-10)
+
+
+@pytest.mark.parametrize('wavelength', wavelengths)
+def test_fast_reflectance(wavelength):
+
+    struct = make_bragg_mirror()
+
+    t_ref, R_ref = struct.calculate_reflectance_reference(wavelength)
+    layer_t = [layer.t for layer in struct.layers]
+
+    t, R = struct.calculate_reflectance(wavelength)
+
+    np.testing.assert_allclose(t, t_ref)
+    np.testing.assert_allclose(R, R_ref, rtol=1e-10)
+
+    for layer, t_ref in zip(struct.layers, layer_t):
+        np.testing.assert_allclose(layer.t, t_ref)
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_sweep(max_workers):
+
+    struct = make_bragg_mirror(num_repeats=2, num_t=50)
+
+    parameters = {
+        (-1, 'thickness'): [60.0, 70.0, 80.0],
+        ('GaAs', 'growth_rate'): [0.15, 0.2],
+        ('AlAs', 'N'): [3.0 - 0.01j, {950.3: 3.1, '469.5': 3.8 - 0.1j}]
+    }
+
+    result = struct.sweep(
+        parameters, wavelengths, max_workers=max_workers, chunk_size=5
+    )
+
+    assert result.shape == (3, 2, 2)
+    assert result.R.shape == (3, 2, 2, 2, 4*50)
+
+    for thickness in parameters[(-1, 'thickness')]:
+        for growth_rate in parameters[('GaAs', 'growth_rate')]:
+            for N in parameters[('AlAs', 'N')]:
+
+                ref = make_bragg_mirror(num_repeats=2, num_t=50)
+                ref.layers[-1].thickness = thickness
+
+                AlAs = Material('AlAs')
+                if isinstance(N, dict):
+                    AlAs.set_N_at_wavelength(950.3, N[950.3])
+                    AlAs.set_N_at_wavelength(469.5, N['469.5'])
+                else:
+                    for wl in wavelengths:
+                        AlAs.set_N_at_wavelength(wl, N)
+
+                for layer in ref.layers:
+                    if layer.material.name == 'GaAs':
+                        layer.growth_rate = growth_rate
+                    else:
+                        layer.material = AlAs
+
+                t, R = ref.calculate_reflectance_map(wavelengths)
+
+                t_sweep, R_sweep = result.sel({
+                    (-1, 'thickness'): thickness,
+                    ('GaAs', 'growth_rate'): growth_rate,
+                    ('AlAs', 'N'): N
+                })
+
+                np.testing.assert_allclose(t_sweep, t)
+                np.testing.assert_allclose(R_sweep, R, rtol=1e-10)
+
+    t, R = result.sel({('GaAs', 'growth_rate'): 0.2})
+    assert R.shape == (3, 2, 2, 4*50)
+
+
+def test_reflectance_at_times():
+
+    struct = make_bragg_mirror()
+
+    t_map, R_map = struct.calculate_reflectance_map(wavelengths)
+
+    # Unsorted times, including before the start and after the end
+    inds = np.random.default_rng(0).permutation(len(t_map))[:300]
+    times = np.concatenate([t_map[inds], [-10.0, t_map[-1] + 10.0]])
+
+    R = struct.calculate_reflectance_at_times(times, wavelengths)
+
+    assert R.shape == (2, len(times))
+    np.testing.assert_allclose(R[:, :-2], R_map[:, inds], rtol=1e-10)
+    np.testing.assert_allclose(R[:, -2], R_map[:, 0], rtol=1e-10)
+    np.testing.assert_allclose(R[:, -1], R_map[:, -1], rtol=1e-10)
+
+    add_int_wavelength(struct)
+    R_mixed = struct.calculate_reflectance_at_times(times, [950.3, 470])
+    np.testing.assert_allclose(R_mixed[0], R[0], rtol=1e-10)
+    np.testing.assert_allclose(
+        R_mixed[1], struct.calculate_reflectance_at_times(times, 470)[0],
+        rtol=1e-10
+    )
+
+
+def test_sweep_no_parameters():
+
+    struct = make_bragg_mirror(num_repeats=2, num_t=50)
+
+    result = struct.sweep({}, wavelengths)
+
+    t, R = struct.calculate_reflectance_map(wavelengths)
+
+    assert result.shape == ()
+    np.testing.assert_allclose(result.t, t)
+    np.testing.assert_allclose(result.R, R, rtol=1e-10)
+
+
+def test_sweep_at_times():
+
+    struct = make_bragg_mirror(num_repeats=2)
+
+    parameters = {(0, 'thickness'): [70.0, 80.0, 90.0]}
+    times = np.linspace(-100.0, 2000.0, 500)
+
+    result = struct.sweep(parameters, wavelengths, chunk_size=2, times=times)
+
+    assert result.R.shape == (3, 2, 500)
+
+    for n, thickness in enumerate(parameters[(0, 'thickness')]):
+        struct.layers[0].thickness = thickness
+        R = struct.calculate_reflectance_at_times(times, wavelengths)
+
+        np.testing.assert_allclose(result.t[n], times)
+        np.testing.assert_allclose(result.R[n], R, rtol=1e-10)
+
+    add_int_wavelength(struct)
+    result = struct.sweep(parameters, [950.3, 470], times=times)
+    R = struct.calculate_reflectance_at_times(times, [950.3, 470])
+    np.testing.assert_allclose(result.R[-1], R, rtol=1e-10)
+
+
+def test_layer_cache(monkeypatch):
+
+    struct = make_bragg_mirror(num_repeats=5, num_t=50)
+
+    # Count the boundary matrices and layer reflectances calculated
+    calls = []
+    interface_matrix = refl_sim.interface_matrix
+    monkeypatch.setattr(
+        refl_sim, 'interface_matrix',
+        lambda N1, N2: calls.append(N1) or interface_matrix(N1, N2)
+    )
+
+    layers = []
+    depth_reflectance = refl_sim.depth_reflectance
+    monkeypatch.setattr(
+        refl_sim, 'depth_reflectance',
+        lambda T, N, thickness, wl, num_t: layers.append(len(thickness))
+        or depth_reflectance(T, N, thickness, wl, num_t)
+    )
+
+    def check():
+        calls.clear()
+        layers.clear()
+        t, R = struct.calculate_reflectance_map(wavelengths)
+        num_calculated = (len(calls), sum(layers))
+
+        for n, wl in enumerate(wavelengths):
+            t_ref, R_ref = struct.calculate_reflectance_reference(wl)
+            np.testing.assert_allclose(t, t_ref)
+            np.testing.assert_allclose(R[n], R_ref, rtol=1e-10)
+
+        return num_calculated
+
+    assert check() == (10, 10)
+    assert check() == (0, 0)
+
+    # Appending or editing the top layer only recalculates that layer
+    struct.add_layer(struct.layers[0].material, 50.0, 0.1)
+    assert check() == (1, 1)
+
+    struct.set_layer(-1, thickness=60.0)
+    assert check() == (0, 1)
+
+    # Growth rates only change the times
+    struct.set_layer(2, growth_rate=0.2)
+    assert check() == (0, 0)
+
+    struct.set_layer(-1, material=struct.layers[1].material)
+    assert check() == (1, 1)
+
+    # Editing a lower layer recalculates the layers above it
+    struct.layers[7].thickness = 70.0
+    assert check() == (3, 4)
+
+    # The boundary matrices alone keep the valid reflectances
+    struct.layers[9].thickness = 70.0
+    layers.clear()
+    struct.calculate_reflectance_at_times([0.0, 100.0], wavelengths)
+    assert (len(layers), check()) == (0, (0, 2))
+
+    # New wavelengths are calculated from scratch
+    calls.clear()
+    struct.calculate_reflectance_map(wavelengths[:1])
+    assert len(calls) == 0
+    struct.use_angstroms_for_structure()
+    struct.calculate_reflectance_map(wavelengths[:1])
+    assert len(calls) == 11